@@ -1,22 +1,118 @@
 import logging
-from telegram import Update, Bot, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
+from logging.handlers import QueueHandler, QueueListener
+from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, ChatMemberHandler, BaseUpdateProcessor
 from telegram.constants import ChatType
+from telegram.request import HTTPXRequest
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+from telegram.helpers import escape_markdown
 import sqlite3
 import asyncio
 from datetime import datetime, timedelta
 import time
 from typing import Dict, List
+from collections import OrderedDict, deque
 import json
 import os
-from aiohttp import web
 import threading
+import sys
+import traceback
+import itertools
+import csv
+import hmac
+import io
+import tempfile
+import zlib
+import random
+import importlib.util
+import httpx
+import queue
+import atexit
+import signal
+import subprocess
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+PROCESS_STARTED = time.monotonic()
+
+# Configure logging: records are queued and written by a background thread, so
+# log calls on the hot path never block the event loop on stderr
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")                   # "text" or "json"
+LOG_SAMPLE_WINDOW = float(os.environ.get("LOG_SAMPLE_WINDOW", 60))  # Seconds per sampling window
+LOG_SAMPLE_BURST = int(os.environ.get("LOG_SAMPLE_BURST", 10))      # Lines per sample_key per window
+
+class LogSampler(logging.Filter):
+    """Passes LOG_SAMPLE_BURST records per sample_key per window and counts the rest.
+    
+    Only records logged with extra={"sample_key": ...} are sampled. The first
+    record of a new window carries how many were suppressed in the last one.
+    """
+    
+    def __init__(self, window=LOG_SAMPLE_WINDOW, burst=LOG_SAMPLE_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._windows: Dict[str, list] = {}  # sample_key -> [window_start, passed, suppressed]
+        self.suppressed: Dict[str, int] = {}
+        self.suppressed_total = 0
+    
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None:
+            return True
+        state = self._windows.get(key)
+        if state is None or record.created - state[0] >= self.window:
+            if state and state[2]:
+                record.suppressed = state[2]
+            state = self._windows[key] = [record.created, 0, 0]
+        if state[1] >= self.burst:
+            state[2] += 1
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            self.suppressed_total += 1
+            return False
+        state[1] += 1
+        return True
+    
+    def get_stats(self):
+        return {"suppressed_total": self.suppressed_total, "suppressed_by_key": dict(self.suppressed)}
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{line} (+{suppressed} similar suppressed)" if suppressed else line
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; tracebacks are already folded into the message by QueueHandler"""
+    
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key in ("sample_key", "suppressed"):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_logging():
+    """Route the root logger through a queue drained by a QueueListener thread"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else
+                         TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(log_sampler)
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+log_sampler = LogSampler()
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 # Bot configuration
@@ -38,6 +134,181 @@ PREMIUM_REACTIONS_PER_POST = 3000  # 3K reactions per post
 REGULAR_REACTIONS_PER_POST = 30    # 30 reactions per post
 TIME_WINDOW_MINUTES = 5            # 5 minutes window
 
+# Membership verification: "poll" re-checks each user daily via get_chat_member,
+# "events" tracks chat_member updates (the bot must be admin of REQUIRED_CHANNELS)
+MEMBERSHIP_MODE = os.environ.get("MEMBERSHIP_MODE", "poll")
+MEMBERSHIP_RECONCILE_SECONDS = int(os.environ.get("MEMBERSHIP_RECONCILE_SECONDS", 600))  # Drift check interval
+MEMBERSHIP_RECONCILE_BATCH = int(os.environ.get("MEMBERSHIP_RECONCILE_BATCH", 20))       # Users re-checked per run
+MEMBERSHIP_STALE_DAYS = 7                                                                # Re-check rows older than this
+LEFT_STATUSES = ('left', 'kicked')
+
+# Premium expiry sweeper
+PREMIUM_SWEEP_SECONDS = int(os.environ.get("PREMIUM_SWEEP_SECONDS", 60))  # How often expired premium is cleared
+PREMIUM_SWEEP_BATCH = 500                                                # Users expired per UPDATE
+
+# Admin channel browser
+CHANNELS_PAGE_SIZE = 10
+CHANNEL_FILTERS = {"all": None, "on": True, "off": False}  # Callback filter key -> auto_react value
+
+# Background /react jobs
+REACT_JOB_WORKERS = int(os.environ.get("REACT_JOB_WORKERS", 2))                  # Concurrent /react jobs
+REACT_QUEUE_SIZE = int(os.environ.get("REACT_QUEUE_SIZE", 100))                  # Jobs waiting across all users
+MAX_PENDING_JOBS_PER_USER = int(os.environ.get("MAX_PENDING_JOBS_PER_USER", 3))  # Queued + running per user
+REACT_PROGRESS_INTERVAL = 2.0                                                    # Min seconds between progress edits
+
+# Updates handled concurrently; each user's (or chat's) updates still run in order
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", 16))
+UPDATE_QUEUE_PER_USER = int(os.environ.get("UPDATE_QUEUE_PER_USER", 8))  # Beyond this a user's updates are dropped
+
+# Process roles: "all" does everything in one process; "supervisor" runs one "ingest"
+# process (updates, commands, web server) and DELIVERY_PROCESSES "delivery" processes,
+# each sending reactions for the channels with abs(channel_id) % DELIVERY_PROCESSES == its
+# DELIVERY_SHARD. channel_posts is the queue between them.
+BOT_ROLE = os.environ.get("BOT_ROLE", "all")
+DELIVERY_PROCESSES = int(os.environ.get("DELIVERY_PROCESSES", max(1, (os.cpu_count() or 2) - 1)))
+DELIVERY_SHARD = int(os.environ.get("DELIVERY_SHARD", 0))                     # Set by the supervisor
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))  # Wait for other processes' writes
+
+# Shared HTTP connection pool for Bot API traffic
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 32))                    # Connections for API calls
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", 30))  # Idle keep-alive per connection
+HTTP_VERSION = os.environ.get("HTTP_VERSION", "1.1")                          # "2" needs httpx[http2]
+LONG_POLL_TIMEOUT = int(os.environ.get("LONG_POLL_TIMEOUT", 30))              # getUpdates long-poll seconds
+
+# Retry queue for failed channel post deliveries
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", 6))          # Before a post is dead-lettered
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 10))           # Seconds, doubled per attempt
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 1800))           # Cap on a single backoff
+DEAD_LETTER_RETENTION_DAYS = 30
+
+# Delivery error classes
+RETRYABLE = "retryable"
+PERMANENT = "permanent"
+RATE_LIMITED = "rate_limited"
+
+def classify_error(error):
+    """Classify a Bot API error as retryable, permanent or rate-limited"""
+    if isinstance(error, RetryAfter):
+        return RATE_LIMITED
+    if isinstance(error, (Forbidden, BadRequest)):
+        # Bot removed from the chat, message deleted, reactions not allowed...
+        return PERMANENT
+    # Timeouts, network errors and anything unexpected
+    return RETRYABLE
+
+def retry_delay(attempts, retry_after=None):
+    """Exponential backoff with jitter, never shorter than a server-requested retry_after"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** max(0, attempts - 1)))
+    delay = random.uniform(delay / 2, delay)
+    if retry_after:
+        delay = max(delay, float(retry_after))
+    return delay
+
+# Per-chat circuit breaker for chats the bot can no longer react in
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 3))     # Chat-level failures before opening
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", 300))           # First cool-down, doubled per failed probe
+BREAKER_MAX_OPEN_SECONDS = 6 * 3600                                                 # Cap on a single cool-down
+BREAKER_DEACTIVATE_HOURS = float(os.environ.get("BREAKER_DEACTIVATE_HOURS", 24))    # Broken this long -> channel deactivated
+CHAT_FAILURE_MARKERS = ("CHAT NOT FOUND", "NOT ENOUGH RIGHTS", "CHAT_ADMIN_REQUIRED", "CHANNEL_PRIVATE", "HAVE NO RIGHTS")
+
+def is_chat_failure(error):
+    """The error concerns the whole chat (bot removed, rights lost), not one message"""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(marker in str(error).upper() for marker in CHAT_FAILURE_MARKERS)
+
+# Pending channel posts are read in keyset batches of this size
+PENDING_POSTS_BATCH = int(os.environ.get("PENDING_POSTS_BATCH", 100))
+
+# Backlog drain policy after downtime
+# DRAIN_ORDER: "oldest" (FIFO) or "newest" (fresh posts jump the backlog)
+DRAIN_ORDER = os.environ.get("DRAIN_ORDER", "oldest")
+MAX_POST_AGE_MINUTES = float(os.environ.get("MAX_POST_AGE_MINUTES", 0))              # 0 disables the age cutoff
+STALE_POST_ACTION = os.environ.get("STALE_POST_ACTION", "defer")                     # "skip" or "defer" (low priority)
+DRAIN_LIVE_SECONDS = float(os.environ.get("DRAIN_LIVE_SECONDS", 300))                # Younger posts are live traffic
+DRAIN_BACKLOG_PER_MINUTE = float(os.environ.get("DRAIN_BACKLOG_PER_MINUTE", 0))      # Cap on older posts, 0 = no cap
+
+# Per-chat allowed reactions, from get_chat(...).available_reactions
+REACTION_CATALOG_TTL = int(os.environ.get("REACTION_CATALOG_TTL", 3600))  # Seconds a chat's reactions are cached
+REACTION_CATALOG_RETRY = 60                                               # Seconds before retrying a failed lookup
+REACTION_CATALOG_SIZE = 10000                                             # Chats cached, least recently used dropped
+
+def is_invalid_reaction(error):
+    """The chat rejected one of the reactions we sent"""
+    return isinstance(error, BadRequest) and "REACTION_INVALID" in str(error).upper()
+
+# In-memory dedupe of redelivered channel posts
+RECENT_POSTS_CAPACITY = int(os.environ.get("RECENT_POSTS_CAPACITY", 50000))  # ~100 bytes per entry
+
+# Health snapshot and probes
+HEALTH_CHECK_INTERVAL = int(os.environ.get("HEALTH_CHECK_INTERVAL", 30))       # Seconds between snapshots
+READY_DB_MAX_MS = float(os.environ.get("READY_DB_MAX_MS", 500))               # /readyz database threshold
+READY_API_MAX_MS = float(os.environ.get("READY_API_MAX_MS", 3000))            # /readyz Bot API threshold
+LIVENESS_MAX_LAG_SECONDS = float(os.environ.get("LIVENESS_MAX_LAG_SECONDS", 5))  # /livez loop stall threshold
+LOOP_LAG_INTERVAL = 1.0                                                       # Seconds between loop lag probes
+LOOP_LAG_SAMPLES = 600                                                        # Probes kept for percentiles (~10 min)
+
+# Blocking-call detector: a watchdog thread logs the loop thread's stack when a
+# callback blocks longer than the threshold. Off unless LOOP_BLOCK_DETECTOR=1.
+LOOP_BLOCK_DETECTOR = os.environ.get("LOOP_BLOCK_DETECTOR", "0") == "1"
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", 250))
+
+# Persistent counters
+COUNTERS_FLUSH_SECONDS = float(os.environ.get("COUNTERS_FLUSH_SECONDS", 5))  # In-memory deltas flushed this often
+
+# Hourly per-channel rollups shown by the channel stats button
+CHANNEL_STATS_LATENCY_BUCKETS = (1, 2, 5, 10, 30, 60, 300, 900, 3600)  # Post-to-reaction latency bucket bounds (s)
+CHANNEL_STATS_RETENTION_DAYS = 8
+
+# Admin-only HTTP endpoints (export, debug) are enabled only when this is set
+ADMIN_API_TOKEN = os.environ.get("ADMIN_API_TOKEN")
+
+# On-demand profiling (admin HTTP endpoints)
+PROFILE_MAX_SECONDS = 60
+
+# Sampled per-post stage traces (GET /debug/traces), optionally pushed to an OTLP/HTTP collector
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0.01))        # Fraction of channel posts traced
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", 500))           # Finished (and in-flight) traces kept
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT")                 # e.g. http://collector:4318/v1/traces
+TRACE_EXPORT_SECONDS = float(os.environ.get("TRACE_EXPORT_SECONDS", 10))    # Push interval for finished traces
+TRACE_SPANS = (                                                             # (span, from stage, to stage)
+    ("persist", "received", "persisted"),
+    ("queue", "persisted", "dequeued"),
+    ("prepare", "dequeued", "api_first"),
+    ("api", "api_first", "api_last"),
+    ("record", "api_last", "processed"),
+)
+
+# Streaming export of history tables
+EXPORT_TABLES = {
+    "permanent_reactions": ["id", "user_id", "target_message_id", "target_chat_id", "reactions_applied", "applied_at", "is_active"],
+    "channel_posts": ["id", "channel_id", "message_id", "post_time", "reactions_sent", "is_processed", "permanent_reaction_id"],
+}
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 1000))      # Rows fetched and written per chunk
+EXPORT_CHUNK_PAUSE = float(os.environ.get("EXPORT_CHUNK_PAUSE", 0.05))  # Seconds yielded to the bot between chunks
+EXPORT_COMMAND_MAX_ROWS = 200000                                        # Per /admin_export file (upload size limit)
+
+# Graceful shutdown
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get("SHUTDOWN_DRAIN_SECONDS", 20))  # Render allows 30s after SIGTERM
+
+def _http_timeouts(call_class, connect, read, write, pool):
+    """Timeouts for one call class, overridable with HTTP_<CLASS>_<KIND>_TIMEOUT"""
+    prefix = f"HTTP_{call_class.upper()}_"
+    return {
+        "connect_timeout": float(os.environ.get(prefix + "CONNECT_TIMEOUT", connect)),
+        "read_timeout": float(os.environ.get(prefix + "READ_TIMEOUT", read)),
+        "write_timeout": float(os.environ.get(prefix + "WRITE_TIMEOUT", write)),
+        "pool_timeout": float(os.environ.get(prefix + "POOL_TIMEOUT", pool)),
+    }
+
+# Per call class timeouts (seconds)
+HTTP_TIMEOUTS = {
+    "long_poll": _http_timeouts("long_poll", connect=10, read=10, write=10, pool=5),
+    "default": _http_timeouts("default", connect=5, read=10, write=10, pool=5),
+    "reactions": _http_timeouts("reactions", connect=5, read=10, write=10, pool=10),
+    "membership": _http_timeouts("membership", connect=3, read=5, write=5, pool=3),
+}
+
 # Define reaction emojis manually for compatibility
 REACTION_EMOJIS = [
     "👍",  # Thumbs up
@@ -62,23 +333,153 @@ REACTION_EMOJIS = [
     "💯",  # Hundred points
 ]
 
+# Emojis Telegram accepts as standard reactions, without variation selectors
+STANDARD_REACTIONS = frozenset([
+    "👍", "👎", "❤", "🔥", "🥰", "👏", "😁", "🤔", "🤯", "😱", "🤬", "😢", "🎉", "🤩", "🤮", "💩",
+    "🙏", "👌", "🕊", "🤡", "🥱", "🥴", "😍", "🐳", "❤\u200d🔥", "🌚", "🌭", "💯", "🤣", "⚡", "🍌",
+    "🏆", "💔", "🤨", "😐", "🍓", "🍾", "💋", "🖕", "😈", "😴", "😭", "🤓", "👻", "👨\u200d💻", "👀",
+    "🎃", "🙈", "😇", "😨", "🤝", "✍", "🤗", "🫡", "🎅", "🎄", "☃", "💅", "🤪", "🗿", "🆒", "💘",
+    "🙉", "🦄", "😘", "💊", "🙊", "😎", "👾", "🤷\u200d♂", "🤷", "🤷\u200d♀", "😡",
+])
+
+def normalize_emoji(emoji):
+    """Drop variation selectors, so "❤️" from our list matches the "❤" Telegram uses"""
+    return emoji.replace("\ufe0f", "")
+
+# Time source
+class Clock:
+    """Wall and monotonic time for scheduling logic; simulator.py swaps in a virtual clock"""
+    
+    def now(self):
+        return datetime.now()
+    
+    def monotonic(self):
+        return time.monotonic()
+    
+    def time(self):
+        return time.time()
+
+clock = Clock()
+
+# Aggregated counters (per day, channel and tier)
+class CounterStore:
+    """Counts events in memory; deltas are flushed to the counters table in one upsert"""
+    
+    def __init__(self):
+        self.pending: Dict[tuple, int] = {}
+        self.totals: Dict[str, int] = {}
+    
+    def incr(self, metric, amount=1, channel_id=0, tier="channel"):
+        key = (clock.now().date().isoformat(), channel_id or 0, tier, metric)
+        self.pending[key] = self.pending.get(key, 0) + amount
+        self.totals[metric] = self.totals.get(metric, 0) + amount
+    
+    def total(self, metric):
+        return self.totals.get(metric, 0)
+    
+    def take_pending(self):
+        """Hand over the unflushed deltas and start a new batch"""
+        pending, self.pending = self.pending, {}
+        return pending
+    
+    def requeue(self, pending):
+        """Put back deltas whose flush failed"""
+        for key, amount in pending.items():
+            self.pending[key] = self.pending.get(key, 0) + amount
+    
+    def restore(self, totals):
+        """Start from the all-time totals stored in the database"""
+        for metric, amount in totals.items():
+            self.totals[metric] = self.totals.get(metric, 0) + amount
+    
+    def reload(self, totals):
+        """Replace the totals with the flushed ones plus what is still unflushed here.
+        
+        Used by the ingest process, whose delivery processes count into the same table.
+        """
+        self.totals = dict(totals)
+        for (_, _, _, metric), amount in self.pending.items():
+            self.totals[metric] = self.totals.get(metric, 0) + amount
+
+counters = CounterStore()
+
+class ChannelStats:
+    """Hourly per-channel activity rollups, accumulated in memory and flushed with the counters.
+    
+    Latency is kept as a histogram (one latency_le_<bound> metric per bucket) so
+    medians over any range of hours can be estimated without the raw posts.
+    """
+    
+    def __init__(self):
+        self.pending: Dict[tuple, int] = {}
+    
+    def incr(self, channel_id, metric, amount=1):
+        key = (clock.now().strftime("%Y-%m-%dT%H"), channel_id, metric)
+        self.pending[key] = self.pending.get(key, 0) + amount
+    
+    def observe_latency(self, channel_id, seconds):
+        bound = next((bound for bound in CHANNEL_STATS_LATENCY_BUCKETS if seconds <= bound), None)
+        self.incr(channel_id, f"latency_le_{bound}" if bound else "latency_le_inf")
+    
+    def take_pending(self):
+        pending, self.pending = self.pending, {}
+        return pending
+    
+    def requeue(self, pending):
+        for key, amount in pending.items():
+            self.pending[key] = self.pending.get(key, 0) + amount
+    
+    @staticmethod
+    def median_latency(totals):
+        """Median post-to-reaction seconds interpolated from the histogram, or None without data"""
+        buckets = [(bound, totals.get(f"latency_le_{bound}", 0)) for bound in CHANNEL_STATS_LATENCY_BUCKETS]
+        buckets.append((None, totals.get("latency_le_inf", 0)))
+        observed = sum(count for _, count in buckets)
+        if not observed:
+            return None
+        seen = 0
+        lower = 0
+        for bound, count in buckets:
+            if count and seen + count >= observed / 2:
+                if bound is None:
+                    return float(lower)
+                return lower + (bound - lower) * (observed / 2 - seen) / count
+            seen += count
+            lower = bound if bound is not None else lower
+        return float(lower)
+
+channel_stats = ChannelStats()
+
 # Health check and monitoring
 class HealthMonitor:
     def __init__(self):
-        self.start_time = datetime.now()
-        self.total_reactions_sent = 0
-        self.total_posts_processed = 0
-        self.last_health_check = datetime.now()
-        self.health_check_interval = 300  # 5 minutes
+        self.start_time = clock.now()
+        self.last_health_check = clock.now()
+        self.health_check_interval = HEALTH_CHECK_INTERVAL
+        # Latest snapshot published by the health check loop, served as-is by probes
+        self.snapshot = None
+        self.snapshot_at = None
+        # Event loop responsiveness
+        self.last_loop_tick = time.monotonic()
+        self.loop_lag = 0.0
+        self.max_loop_lag = 0.0
+    
+    @property
+    def total_reactions_sent(self):
+        return counters.total("reactions_sent")
     
-    def increment_reactions(self, count):
-        self.total_reactions_sent += count
+    @property
+    def total_posts_processed(self):
+        return counters.total("posts_processed")
     
-    def increment_posts(self):
-        self.total_posts_processed += 1
+    def increment_reactions(self, count, channel_id=0, tier="channel"):
+        counters.incr("reactions_sent", count, channel_id, tier)
+    
+    def increment_posts(self, channel_id=0, tier="channel"):
+        counters.incr("posts_processed", 1, channel_id, tier)
     
     def get_uptime(self):
-        return datetime.now() - self.start_time
+        return clock.now() - self.start_time
     
     def get_stats(self):
         return {
@@ -90,15 +491,882 @@ class HealthMonitor:
         }
     
     def update_health_check(self):
-        self.last_health_check = datetime.now()
+        self.last_health_check = clock.now()
+    
+    def publish(self, snapshot):
+        self.snapshot = snapshot
+        self.snapshot_at = time.monotonic()
+    
+    def snapshot_age(self):
+        return time.monotonic() - self.snapshot_at if self.snapshot_at else None
+    
+    def record_loop_tick(self, lag):
+        self.last_loop_tick = time.monotonic()
+        self.loop_lag = lag
+        self.max_loop_lag = max(self.max_loop_lag, lag)
+    
+    def loop_stalled_for(self):
+        """Seconds since the loop lag probe last ran"""
+        return time.monotonic() - self.last_loop_tick
 
 # Initialize health monitor
 health_monitor = HealthMonitor()
 
+# Recently seen channel posts
+class RecentPosts:
+    """Bounded LRU of (chat_id, message_id) keys for posts already ingested"""
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._keys = OrderedDict()
+        self.duplicates_dropped = 0
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def seen(self, chat_id, message_id):
+        """Return True for a repeat (and count it), otherwise remember the key"""
+        key = (chat_id, message_id)
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            self.duplicates_dropped += 1
+            return True
+        self.add(chat_id, message_id)
+        return False
+    
+    def add(self, chat_id, message_id):
+        self._keys[(chat_id, message_id)] = None
+        self._keys.move_to_end((chat_id, message_id))
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+    
+    def discard(self, chat_id, message_id):
+        self._keys.pop((chat_id, message_id), None)
+    
+    def seed(self, keys):
+        """Load keys ordered oldest to newest"""
+        for chat_id, message_id in keys:
+            self.add(chat_id, message_id)
+
+# HTTP request layer with pool-wait metrics
+class PooledRequest(HTTPXRequest):
+    """HTTPXRequest that records how long calls wait for a pooled connection"""
+    
+    def __init__(self, name, connection_pool_size, timeouts):
+        http_version = HTTP_VERSION
+        if http_version == "2" and importlib.util.find_spec("h2") is None:
+            logger.warning("⚠️ HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+            http_version = "1.1"
+        
+        super().__init__(
+            connection_pool_size=connection_pool_size,
+            http_version=http_version,
+            httpx_kwargs={
+                "limits": httpx.Limits(
+                    max_connections=connection_pool_size,
+                    max_keepalive_connections=connection_pool_size,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                )
+            },
+            **timeouts
+        )
+        self.name = name
+        self.pool_size = connection_pool_size
+        self.default_pool_timeout = timeouts["pool_timeout"]
+        self._slots = asyncio.Semaphore(connection_pool_size)
+        self.in_flight = 0
+        self.total_requests = 0
+        self.waited_requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.pool_timeouts = 0
+    
+    async def do_request(self, *args, **kwargs):
+        # Callers pass a number, None (wait forever) or PTB's DEFAULT_NONE (use our default)
+        pool_timeout = kwargs.get("pool_timeout", self.default_pool_timeout)
+        if pool_timeout is not None and not isinstance(pool_timeout, (int, float)):
+            pool_timeout = self.default_pool_timeout
+        
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), pool_timeout)
+        except asyncio.TimeoutError:
+            self.pool_timeouts += 1
+            raise TimedOut(
+                "Pool timeout: All connections in the connection pool are occupied. Request was *not* sent to Telegram."
+            ) from None
+        try:
+            waited = time.monotonic() - started
+            self.total_requests += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            if waited > 0.001:
+                self.waited_requests += 1
+            
+            self.in_flight += 1
+            try:
+                return await super().do_request(*args, **kwargs)
+            except Exception as e:
+                if "pool timeout" in str(e).lower():
+                    self.pool_timeouts += 1
+                raise
+            finally:
+                self.in_flight -= 1
+        finally:
+            self._slots.release()
+    
+    def get_stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self.in_flight,
+            "requests": self.total_requests,
+            "waited_requests": self.waited_requests,
+            "avg_wait_ms": round(self.total_wait / self.total_requests * 1000, 2) if self.total_requests else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "pool_timeouts": self.pool_timeouts
+        }
+
+class BotHTTP:
+    """The shared request layer used by the Application and all Bot API calls"""
+    
+    def __init__(self):
+        # getUpdates keeps one connection parked for the whole long-poll, so it
+        # gets its own single-connection pool; everything else shares one pool.
+        self.long_poll_request = PooledRequest("long_poll", 1, HTTP_TIMEOUTS["long_poll"])
+        self.api_request = PooledRequest("api", HTTP_POOL_SIZE, HTTP_TIMEOUTS["default"])
+    
+    @staticmethod
+    def timeouts(call_class):
+        """Timeout keyword arguments for a Bot API call of the given class"""
+        return HTTP_TIMEOUTS.get(call_class, HTTP_TIMEOUTS["default"])
+    
+    def get_stats(self):
+        return {
+            "long_poll": self.long_poll_request.get_stats(),
+            "api": self.api_request.get_stats()
+        }
+
+# Background /react job
+class ReactJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, user_id, chat_id, message_id, num_reactions, job_id=None, status_chat_id=None, status_message_id=None):
+        # Jobs from the react_jobs table (multi-process mode) keep their row id
+        self.job_id = job_id or next(ReactJob._ids)
+        self.persisted = job_id is not None
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.num_reactions = num_reactions
+        self.status_message = None
+        self.status_chat_id = status_chat_id
+        self.status_message_id = status_message_id
+        self.created_at = clock.now()
+        self.quota_reserved = num_reactions if self.persisted else 0
+
+    @property
+    def quota_key(self):
+        return (self.user_id, self.chat_id, self.message_id)
+
+# Unprocessed channel post
+class PendingPost:
+    """One row of the pending-post backlog; slotted so large batches stay small"""
+    __slots__ = ('id', 'channel_id', 'message_id', 'channel_title', 'reactions_sent', 'post_time')
+
+    def __init__(self, id, channel_id, message_id, channel_title, reactions_sent, post_time):
+        self.id = id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.channel_title = channel_title
+        self.reactions_sent = reactions_sent or 0
+        self.post_time = post_time
+
+    @property
+    def position(self):
+        """Keyset position of this post in the backlog"""
+        return (self.post_time, self.id)
+    
+    def age(self):
+        """Seconds since the post was made"""
+        post_time = _to_datetime(self.post_time)
+        return (clock.now() - post_time).total_seconds() if post_time else 0.0
+
+# Drain rate cap
+class RateLimiter:
+    """Token bucket refilled at rate_per_minute, holding up to a minute's worth"""
+    
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = clock.monotonic()
+    
+    def try_acquire(self):
+        now = clock.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+def _to_datetime(value):
+    """TIMESTAMP columns come back as datetime (PostgreSQL) or ISO strings (SQLite)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+# Allowed reactions per chat
+class ReactionCatalog:
+    """Caches which of our reactions each chat allows, so rejected emojis are never sent"""
+    
+    def __init__(self, ttl=REACTION_CATALOG_TTL):
+        self.ttl = ttl
+        self._entries = OrderedDict()  # chat_id -> (expires_at, allowed emojis), least recently used first
+        self._locks: Dict[int, list] = {}  # chat_id -> [lock, callers holding or waiting]; lookups in progress only
+        self.hits = 0
+        self.fetches = 0
+    
+    async def get(self, bot, chat_id, **timeouts):
+        """Emojis allowed in the chat, fetched with get_chat when missing or expired"""
+        allowed = self._cached(chat_id)
+        if allowed is not None:
+            return allowed
+        
+        # One lookup per chat at a time; concurrent callers reuse its result
+        lock = self._locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        lock[1] += 1
+        try:
+            async with lock[0]:
+                allowed = self._cached(chat_id)
+                if allowed is not None:
+                    return allowed
+                
+                self.fetches += 1
+                try:
+                    chat = await bot.get_chat(chat_id, **timeouts)
+                    allowed = self.allowed_emojis(chat.available_reactions)
+                    expires_at = clock.monotonic() + self.ttl
+                except Exception as e:
+                    # Fall back to the standard emojis and look again soon
+                    logger.warning(f"Could not fetch available reactions for chat {chat_id}: {e}")
+                    allowed = self.allowed_emojis(None)
+                    expires_at = clock.monotonic() + REACTION_CATALOG_RETRY
+                self._entries[chat_id] = (expires_at, allowed)
+                self._entries.move_to_end(chat_id)
+                if len(self._entries) > REACTION_CATALOG_SIZE:
+                    self._entries.popitem(last=False)
+                return allowed
+        finally:
+            lock[1] -= 1
+            if not lock[1]:
+                del self._locks[chat_id]
+    
+    def _cached(self, chat_id):
+        entry = self._entries.get(chat_id)
+        if entry and entry[0] > clock.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(chat_id)
+            return entry[1]
+        return None
+    
+    @staticmethod
+    def allowed_emojis(available_reactions):
+        """Our emojis the chat accepts; None from the API means every standard emoji is allowed.
+        
+        Chats that allow none of REACTION_EMOJIS get an empty list rather than
+        whatever else they accept, which may include negative reactions.
+        """
+        if available_reactions is None:
+            return [emoji for emoji in map(normalize_emoji, REACTION_EMOJIS) if emoji in STANDARD_REACTIONS]
+        # Sent in the chat's own spelling, matched without variation selectors
+        chat_emojis = {normalize_emoji(reaction.emoji): reaction.emoji
+                       for reaction in available_reactions if getattr(reaction, 'emoji', None)}
+        return [chat_emojis[emoji] for emoji in map(normalize_emoji, REACTION_EMOJIS) if emoji in chat_emojis]
+    
+    def invalidate(self, chat_id):
+        self._entries.pop(chat_id, None)
+    
+    def get_stats(self):
+        return {"chats": len(self._entries), "hits": self.hits, "fetches": self.fetches}
+
+# Circuit breaker per chat
+class CircuitBreaker:
+    """Stops sending to chats that keep failing at the chat level.
+    
+    closed: calls go through. open: calls are skipped until the cool-down ends.
+    half_open: one probe is let through; success closes the breaker, another
+    chat-level failure reopens it with a doubled cool-down.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, open_seconds=BREAKER_OPEN_SECONDS):
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self._chats: Dict[int, dict] = {}  # chat_id -> state, failures, opened_at, open_for, broken_since
+        self.skipped = 0
+    
+    def state(self, chat_id):
+        entry = self._chats.get(chat_id)
+        return entry['state'] if entry else self.CLOSED
+    
+    def allow(self, chat_id):
+        """Whether to call the API for this chat now; moves open breakers to half-open when due"""
+        entry = self._chats.get(chat_id)
+        if not entry or entry['state'] == self.CLOSED:
+            return True
+        now = clock.monotonic()
+        # Cool-down over: let one probe through (also replaces a probe that never reported back)
+        if now >= entry['opened_at'] + entry['open_for']:
+            entry['state'] = self.HALF_OPEN
+            entry['opened_at'] = now
+            return True
+        self.skipped += 1
+        return False
+    
+    def cooling_down(self, chat_id):
+        """Whether allow() would skip this chat now, without starting a probe"""
+        entry = self._chats.get(chat_id)
+        if not entry or entry['state'] == self.CLOSED:
+            return False
+        return clock.monotonic() < entry['opened_at'] + entry['open_for']
+    
+    def record_success(self, chat_id):
+        if self._chats.pop(chat_id, None):
+            logger.info(f"🟢 Circuit closed for chat {chat_id}")
+    
+    def record_failure(self, chat_id, error):
+        """Count a failed delivery; returns True if it was a chat-level failure"""
+        entry = self._chats.get(chat_id)
+        if not is_chat_failure(error):
+            # Inconclusive probe: stay open for another cool-down at the same length
+            if entry and entry['state'] == self.HALF_OPEN:
+                entry['state'] = self.OPEN
+                entry['opened_at'] = clock.monotonic()
+            return False
+        
+        now = clock.monotonic()
+        if not entry:
+            entry = self._chats[chat_id] = {'state': self.CLOSED, 'failures': 0, 'opened_at': now,
+                                            'open_for': self.open_seconds, 'broken_since': now}
+        entry['failures'] += 1
+        if entry['state'] == self.HALF_OPEN:
+            entry['open_for'] = min(entry['open_for'] * 2, BREAKER_MAX_OPEN_SECONDS)
+        elif entry['state'] == self.CLOSED and entry['failures'] < self.threshold:
+            return True
+        entry['state'] = self.OPEN
+        entry['opened_at'] = now
+        logger.warning(f"🔴 Circuit open for chat {chat_id} for {entry['open_for']:.0f}s: {error}")
+        return True
+    
+    def broken_for(self, chat_id):
+        """Seconds since the chat started failing without a success in between"""
+        entry = self._chats.get(chat_id)
+        return clock.monotonic() - entry['broken_since'] if entry else 0.0
+    
+    def reset(self, chat_id):
+        self._chats.pop(chat_id, None)
+    
+    def get_stats(self):
+        states = [entry['state'] for entry in self._chats.values()]
+        return {
+            "open": states.count(self.OPEN),
+            "half_open": states.count(self.HALF_OPEN),
+            "failing": states.count(self.CLOSED),
+            "skipped": self.skipped
+        }
+
+# Premium tiers
+class PremiumTiers:
+    """In-memory map of premium users to their expiry, so tier lookups never hit the database"""
+    
+    def __init__(self):
+        self._expiry: Dict[int, float] = {}  # user_id -> premium_until as a POSIX timestamp
+    
+    def __len__(self):
+        return len(self._expiry)
+    
+    def load(self, rows):
+        """Replace the map with (user_id, premium_until) rows"""
+        self._expiry = {}
+        for user_id, premium_until in rows:
+            self.set(user_id, premium_until)
+    
+    def set(self, user_id, premium_until):
+        premium_until = _to_datetime(premium_until)
+        if premium_until:
+            self._expiry[user_id] = premium_until.timestamp()
+        else:
+            self._expiry.pop(user_id, None)
+    
+    def remove(self, user_id):
+        self._expiry.pop(user_id, None)
+    
+    def expiry(self, user_id):
+        expires_at = self._expiry.get(user_id)
+        return datetime.fromtimestamp(expires_at) if expires_at else None
+    
+    def tier(self, user_id):
+        if user_id in ADMIN_IDS:
+            return "admin"
+        expires_at = self._expiry.get(user_id)
+        # Expired entries read as regular until the sweeper clears them
+        if expires_at and expires_at > clock.time():
+            return "premium"
+        return "regular"
+    
+    def limit(self, user_id):
+        """Reactions per post allowed for this user"""
+        return PREMIUM_REACTIONS_PER_POST if self.tier(user_id) in ("admin", "premium") else REGULAR_REACTIONS_PER_POST
+
+premium_tiers = PremiumTiers()
+
+# Concurrent update processing
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """Handles updates concurrently, but one at a time per user (or chat when there is no user)"""
+    
+    def __init__(self, concurrency=UPDATE_CONCURRENCY, per_user=UPDATE_QUEUE_PER_USER):
+        # The base semaphore is acquired before do_process_update, so it can't be
+        # taken after the user's lock; it admits everything and _running limits
+        # concurrency once an update holds its lock. Queues are capped per user
+        # instead, so one user flooding commands can't pile up unbounded work;
+        # channel posts are never dropped, a busy channel just queues them in order.
+        super().__init__(sys.maxsize)
+        self.concurrency = concurrency
+        self.per_user = per_user
+        self._running = asyncio.Semaphore(concurrency)
+        self._keys: Dict[int, list] = {}  # user/chat id -> [lock, updates holding or waiting]
+        self.in_flight = 0
+        self.waiting = 0
+        self.dropped = 0
+    
+    async def do_process_update(self, update, coroutine):
+        source = (update.effective_user or update.effective_chat) if isinstance(update, Update) else None
+        if source is None:
+            await self._run(coroutine)
+            return
+        
+        entry = self._keys.setdefault(source.id, [asyncio.Lock(), 0])
+        is_channel_post = update.channel_post is not None or update.edited_channel_post is not None
+        if entry[1] >= self.per_user and not is_channel_post:
+            coroutine.close()
+            self.dropped += 1
+            logger.warning(f"🚱 Dropped an update from {source.id}: {entry[1]} of theirs already queued",
+                           extra={"sample_key": "update_dropped"})
+            return
+        entry[1] += 1
+        try:
+            self.waiting += 1
+            try:
+                await entry[0].acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                await self._run(coroutine)
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._keys[source.id]
+    
+    async def _run(self, coroutine):
+        async with self._running:
+            self.in_flight += 1
+            try:
+                await coroutine
+            finally:
+                self.in_flight -= 1
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+
+# Background task supervision
+class TaskSupervisor:
+    """Runs background loops and restarts them with backoff if they crash"""
+    
+    def __init__(self, restart_delay=1.0, max_restart_delay=60.0):
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.restarts: Dict[str, int] = {}
+    
+    def start(self, name, factory):
+        """Start factory() as a supervised task; factory must return a new coroutine each call"""
+        self.restarts.setdefault(name, 0)
+        self.tasks[name] = asyncio.create_task(self._supervise(name, factory), name=name)
+    
+    async def _supervise(self, name, factory):
+        delay = self.restart_delay
+        while True:
+            started = clock.monotonic()
+            try:
+                await factory()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"💥 Background task {name} crashed: {e}")
+            
+            self.restarts[name] += 1
+            # A task that ran for a while before crashing starts over with a short delay
+            if clock.monotonic() - started > self.max_restart_delay:
+                delay = self.restart_delay
+            logger.info(f"🔁 Restarting {name} in {delay:.0f}s (restart #{self.restarts[name]})")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+    
+    async def stop(self):
+        """Cancel all supervised tasks and wait for them to finish"""
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+    
+    def get_stats(self):
+        return {
+            name: {"running": not task.done(), "restarts": self.restarts.get(name, 0)}
+            for name, task in self.tasks.items()
+        }
+
+class ProcessSupervisor:
+    """Runs the ingest and delivery processes and restarts them with backoff if they exit"""
+    
+    def __init__(self, restart_delay=1.0, max_restart_delay=60.0):
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.roles = {"ingest": {"BOT_ROLE": "ingest"}}
+        for shard in range(DELIVERY_PROCESSES):
+            self.roles[f"delivery_{shard + 1}"] = {"BOT_ROLE": "delivery", "DELIVERY_SHARD": str(shard)}
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self.started: Dict[str, float] = {}
+        self.delays = {name: restart_delay for name in self.roles}
+        self.restart_at: Dict[str, float] = {}
+        self.restarts = {name: 0 for name in self.roles}
+        self.stopping = threading.Event()
+    
+    def spawn(self, name):
+        env = dict(os.environ, DELIVERY_PROCESSES=str(DELIVERY_PROCESSES), **self.roles[name])
+        self.processes[name] = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+        self.started[name] = time.monotonic()
+        logger.info(f"🧩 Started {name} (pid {self.processes[name].pid})")
+    
+    def run(self):
+        """Spawn every role and keep them running until SIGTERM/SIGINT, which is forwarded to them"""
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        for name in self.roles:
+            self.spawn(name)
+        
+        while not self.stopping.wait(1):
+            now = time.monotonic()
+            for name, process in self.processes.items():
+                code = process.poll()
+                if code is None:
+                    continue
+                if name not in self.restart_at:
+                    # A process that ran for a while before exiting starts over with a short delay
+                    if now - self.started[name] > self.max_restart_delay:
+                        self.delays[name] = self.restart_delay
+                    self.restart_at[name] = now + self.delays[name]
+                    logger.warning(f"💥 {name} exited with code {code}, restarting in {self.delays[name]:.0f}s")
+                elif now >= self.restart_at[name]:
+                    del self.restart_at[name]
+                    self.restarts[name] += 1
+                    self.delays[name] = min(self.delays[name] * 2, self.max_restart_delay)
+                    self.spawn(name)
+        
+        self.stop_all()
+    
+    def request_stop(self, signum, frame):
+        self.stopping.set()
+    
+    def stop_all(self):
+        """Forward SIGTERM and give the processes the drain deadline before killing them"""
+        running = [process for process in self.processes.values() if process.poll() is None]
+        logger.info(f"🛑 Stopping {len(running)} processes")
+        for process in running:
+            process.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + SHUTDOWN_DRAIN_SECONDS + 5
+        for process in running:
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"⏱️ Killing pid {process.pid} after the drain deadline")
+                process.kill()
+                process.wait()
+        logger.info("👋 All processes stopped")
+
+# Per-post latency tracing
+class PostTrace:
+    """Stage timestamps (epoch seconds) of one sampled channel post"""
+    __slots__ = ("trace_id", "channel_id", "message_id", "stages", "attempts", "reactions", "outcome")
+    
+    def __init__(self, channel_id, message_id):
+        self.trace_id = os.urandom(16).hex()
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.stages = {}
+        self.attempts = 0
+        self.reactions = 0
+        self.outcome = None
+    
+    def mark(self, stage, overwrite=False):
+        """Record a stage; retried posts keep their first dequeue and API call unless overwritten"""
+        if overwrite or stage not in self.stages:
+            self.stages[stage] = clock.time()
+    
+    def durations(self):
+        return {
+            name: round(self.stages[end] - self.stages[start], 3)
+            for name, start, end in TRACE_SPANS
+            if start in self.stages and end in self.stages
+        }
+    
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "channel_id": self.channel_id,
+            "message_id": self.message_id,
+            "outcome": self.outcome,
+            "attempts": self.attempts,
+            "reactions": self.reactions,
+            "stages": {stage: datetime.fromtimestamp(at).isoformat() for stage, at in self.stages.items()},
+            "durations": self.durations()
+        }
+
+class PostTracer:
+    """Samples channel posts at ingest and follows them through the queue by channel_posts id"""
+    
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, capacity=TRACE_BUFFER_SIZE, export=bool(TRACE_OTLP_ENDPOINT)):
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        self.active = OrderedDict()  # post id -> PostTrace still in the pipeline
+        self.finished = deque(maxlen=capacity)
+        self.unexported = deque(maxlen=capacity) if export else None
+        self.sampled = 0
+        self.evicted = 0
+        self.export_failures = 0
+    
+    def sample(self, channel_id, message_id):
+        """Sampling decided by the post itself, so every process and every dequeue agrees"""
+        bucket = zlib.crc32(f"{channel_id}:{message_id}".encode()) / 0x100000000
+        if self.sample_rate <= 0 or bucket >= self.sample_rate:
+            return False
+        self.sampled += 1
+        return True
+    
+    def start(self, channel_id, message_id):
+        """A new trace marked received, or None when this post isn't sampled"""
+        if not self.sample(channel_id, message_id):
+            return None
+        trace = PostTrace(channel_id, message_id)
+        trace.mark("received")
+        return trace
+    
+    def adopt(self, post):
+        """Trace a post first seen when dequeued, as delivery processes never see its ingest"""
+        if not self.sample(post.channel_id, post.message_id):
+            return None
+        trace = PostTrace(post.channel_id, post.message_id)
+        post_time = _to_datetime(post.post_time)
+        if post_time:
+            trace.stages["persisted"] = post_time.timestamp()
+        self.track(post.id, trace)
+        return trace
+    
+    def track(self, post_id, trace):
+        trace.mark("persisted")
+        self.active[post_id] = trace
+        # Posts that never finish (deactivated channels, skipped as stale) age out here
+        if len(self.active) > self.capacity:
+            self.active.popitem(last=False)
+            self.evicted += 1
+    
+    def get(self, post_id):
+        return self.active.get(post_id) if self.active else None
+    
+    def finish(self, post_id, outcome):
+        trace = self.active.pop(post_id, None)
+        if trace is None:
+            return
+        if outcome == "processed":
+            trace.mark("processed")
+        trace.outcome = outcome
+        self.finished.append(trace)
+        if self.unexported is not None:
+            self.unexported.append(trace)
+    
+    def take_unexported(self):
+        traces = list(self.unexported)
+        self.unexported.clear()
+        return traces
+    
+    def summary(self):
+        """Per-span duration percentiles in seconds over the finished traces"""
+        spans = {}
+        for name, _, _ in TRACE_SPANS:
+            values = sorted(d[name] for d in (t.durations() for t in self.finished) if name in d)
+            if values:
+                spans[name] = {
+                    "count": len(values),
+                    "p50": values[int(0.50 * (len(values) - 1))],
+                    "p95": values[int(0.95 * (len(values) - 1))],
+                    "max": values[-1]
+                }
+        return spans
+    
+    def get_stats(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "sampled": self.sampled,
+            "active": len(self.active),
+            "finished": len(self.finished),
+            "evicted": self.evicted,
+            "export_failures": self.export_failures
+        }
+    
+    @staticmethod
+    def to_otlp(traces):
+        """OTLP/JSON ExportTraceServiceRequest: a root span per post and a child span per stage"""
+        def nanos(at):
+            return str(int(at * 1e9))
+        
+        def attribute(key, value):
+            return {"key": key, "value": {"intValue": str(value)} if isinstance(value, int) else {"stringValue": str(value)}}
+        
+        spans = []
+        for trace in traces:
+            stages = trace.stages
+            root_id = os.urandom(8).hex()
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": root_id,
+                "name": "channel_post",
+                "kind": 1,
+                "startTimeUnixNano": nanos(min(stages.values())),
+                "endTimeUnixNano": nanos(max(stages.values())),
+                "attributes": [
+                    attribute("channel.id", trace.channel_id),
+                    attribute("message.id", trace.message_id),
+                    attribute("delivery.attempts", trace.attempts),
+                    attribute("delivery.reactions", trace.reactions),
+                    attribute("delivery.outcome", trace.outcome),
+                ],
+                "status": {"code": 1} if trace.outcome == "processed" else {"code": 2, "message": str(trace.outcome)}
+            })
+            for name, start, end in TRACE_SPANS:
+                if start in stages and end in stages:
+                    spans.append({
+                        "traceId": trace.trace_id,
+                        "spanId": os.urandom(8).hex(),
+                        "parentSpanId": root_id,
+                        "name": name,
+                        "kind": 1,
+                        "startTimeUnixNano": nanos(stages[start]),
+                        "endTimeUnixNano": nanos(stages[end])
+                    })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", "telegram-reaction-bot")]},
+            "scopeSpans": [{"scope": {"name": "reaction_bot"}, "spans": spans}]
+        }]}
+
+# Event loop lag and blocking-call monitoring
+class LoopLagMonitor:
+    """Measures event loop scheduling lag and optionally reports callbacks that block it"""
+    
+    def __init__(self, interval=LOOP_LAG_INTERVAL, threshold=LOOP_BLOCK_THRESHOLD_MS / 1000):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = deque(maxlen=LOOP_LAG_SAMPLES)
+        self.blocked_events = 0
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._watchdog = None
+        self._stop = threading.Event()
+    
+    async def run(self):
+        """Probe lag by measuring how late a fixed sleep wakes up"""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.samples.append(lag)
+            health_monitor.record_loop_tick(lag)
+    
+    def percentiles(self):
+        """Lag percentiles in milliseconds over the recent samples"""
+        if not self.samples:
+            return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        
+        def pick(fraction):
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+        
+        return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 1)}
+    
+    def get_stats(self):
+        return dict(self.percentiles(), samples=len(self.samples), blocked_events=self.blocked_events,
+                    block_detector=self._watchdog is not None)
+    
+    def start_block_detector(self, loop):
+        """Start the watchdog thread; must be called from the loop thread"""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._beat()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-block-detector", daemon=True)
+        self._watchdog.start()
+        logger.info(f"🐢 Blocking-call detector enabled (threshold {self.threshold * 1000:.0f} ms)")
+    
+    def stop_block_detector(self):
+        self._stop.set()
+        self._watchdog = None
+    
+    def _beat(self):
+        # Runs on the loop; a late beat means something held the loop
+        self._last_beat = time.monotonic()
+        if not self._stop.is_set():
+            self._loop.call_later(self.threshold / 4, self._beat)
+    
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            last_beat = self._last_beat
+            blocked_for = time.monotonic() - last_beat
+            if blocked_for < self.threshold or last_beat == reported_beat:
+                continue
+            # Report each stall once, with whatever the loop thread is running now
+            reported_beat = last_beat
+            self.blocked_events += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            try:
+                task = asyncio.current_task(self._loop)
+            except RuntimeError:
+                task = None
+            coroutine = task.get_coro() if task else None
+            logger.warning(
+                f"🐢 Event loop blocked for {blocked_for * 1000:.0f}+ ms "
+                f"in task {task.get_name() if task else '<none>'} ({getattr(coroutine, '__qualname__', coroutine)}):\n{stack}"
+            )
+
 # Database setup
 class Database:
     def __init__(self):
         self.db_path = os.environ.get("DATABASE_URL", "bot_data.db")
+        self.conn = None
+        self.is_postgres = False
+        # Statements from worker threads (health snapshot) must not interleave with the loop's
+        self.lock = threading.RLock()
+    
+    def connect(self):
+        """Open the database connection and create/verify tables"""
         if self.db_path.startswith("postgres://"):
             # For PostgreSQL (Render)
             try:
@@ -108,27 +1376,53 @@ class Database:
                 logger.info("✅ Connected to PostgreSQL database")
             except ImportError:
                 logger.warning("⚠️ PostgreSQL not available, falling back to SQLite")
-                self.conn = sqlite3.connect("bot_data.db", check_same_thread=False)
+                self.conn = self.connect_sqlite("bot_data.db")
                 self.is_postgres = False
         else:
             # For SQLite (local development)
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn = self.connect_sqlite(self.db_path)
             self.is_postgres = False
             logger.info("✅ Connected to SQLite database")
         self.create_tables()
     
+    @staticmethod
+    def connect_sqlite(path):
+        """WAL lets delivery processes read while another one writes; writers wait instead of failing"""
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        return conn
+    
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+    
     def execute_query(self, query, params=None):
-        cursor = self.conn.cursor()
-        try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            self.conn.commit()
-            return cursor
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                self.conn.commit()
+                return cursor
+            except Exception as e:
+                self.conn.rollback()
+                raise e
+    
+    def execute_many(self, query, params_list):
+        """Run one statement for many parameter sets in a single transaction"""
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.executemany(query, params_list)
+                self.conn.commit()
+                return cursor
+            except Exception as e:
+                self.conn.rollback()
+                raise e
     
     def create_tables(self):
         if self.is_postgres:
@@ -167,15 +1461,93 @@ class Database:
                     )
                 ''')
                 self.execute_query('''
-                    CREATE TABLE IF NOT EXISTS channel_posts (
-                        id SERIAL PRIMARY KEY,
-                        channel_id BIGINT,
-                        message_id BIGINT,
-                        post_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        reactions_sent INTEGER DEFAULT 0,
-                        is_processed BOOLEAN DEFAULT FALSE,
-                        permanent_reaction_id INTEGER
-                    )
+                    CREATE TABLE IF NOT EXISTS channel_posts (
+                        id SERIAL PRIMARY KEY,
+                        channel_id BIGINT,
+                        message_id BIGINT,
+                        post_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        reactions_sent INTEGER DEFAULT 0,
+                        is_processed BOOLEAN DEFAULT FALSE,
+                        permanent_reaction_id INTEGER
+                    )
+                ''')
+                # /react jobs handed from the ingest process to delivery processes
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS react_jobs (
+                        id SERIAL PRIMARY KEY,
+                        user_id BIGINT,
+                        chat_id BIGINT,
+                        message_id BIGINT,
+                        num_reactions INTEGER,
+                        status_chat_id BIGINT,
+                        status_message_id BIGINT,
+                        is_running BOOLEAN DEFAULT FALSE,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS delivery_retries (
+                        post_id BIGINT PRIMARY KEY,
+                        channel_id BIGINT,
+                        message_id BIGINT,
+                        attempts INTEGER DEFAULT 0,
+                        next_attempt_at TIMESTAMP,
+                        error_class TEXT,
+                        last_error TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS dead_letters (
+                        id SERIAL PRIMARY KEY,
+                        post_id BIGINT,
+                        channel_id BIGINT,
+                        message_id BIGINT,
+                        attempts INTEGER,
+                        error_class TEXT,
+                        last_error TEXT,
+                        failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS counters (
+                        day TEXT,
+                        channel_id BIGINT DEFAULT 0,
+                        tier TEXT,
+                        metric TEXT,
+                        value BIGINT DEFAULT 0,
+                        PRIMARY KEY (day, channel_id, tier, metric)
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS channel_stats_hourly (
+                        channel_id BIGINT,
+                        hour TEXT,
+                        metric TEXT,
+                        value BIGINT DEFAULT 0,
+                        PRIMARY KEY (channel_id, hour, metric)
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS channel_members (
+                        channel_username TEXT,
+                        user_id BIGINT,
+                        status TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (channel_username, user_id)
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE INDEX IF NOT EXISTS idx_channel_members_updated
+                    ON channel_members (updated_at)
+                ''')
+                self.execute_query('''
+                    CREATE INDEX IF NOT EXISTS idx_users_premium_until
+                    ON users (premium_until) WHERE is_premium = TRUE
+                ''')
+                self.execute_query('''
+                    CREATE INDEX IF NOT EXISTS idx_channel_posts_pending
+                    ON channel_posts (is_processed, post_time, id)
                 ''')
                 logger.info("✅ PostgreSQL tables created/verified")
             except Exception as e:
@@ -226,6 +1598,84 @@ class Database:
                         permanent_reaction_id INTEGER
                     )
                 ''')
+                # /react jobs handed from the ingest process to delivery processes
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS react_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER,
+                        chat_id INTEGER,
+                        message_id INTEGER,
+                        num_reactions INTEGER,
+                        status_chat_id INTEGER,
+                        status_message_id INTEGER,
+                        is_running INTEGER DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS delivery_retries (
+                        post_id INTEGER PRIMARY KEY,
+                        channel_id INTEGER,
+                        message_id INTEGER,
+                        attempts INTEGER DEFAULT 0,
+                        next_attempt_at TIMESTAMP,
+                        error_class TEXT,
+                        last_error TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS dead_letters (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        post_id INTEGER,
+                        channel_id INTEGER,
+                        message_id INTEGER,
+                        attempts INTEGER,
+                        error_class TEXT,
+                        last_error TEXT,
+                        failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS counters (
+                        day TEXT,
+                        channel_id INTEGER DEFAULT 0,
+                        tier TEXT,
+                        metric TEXT,
+                        value INTEGER DEFAULT 0,
+                        PRIMARY KEY (day, channel_id, tier, metric)
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS channel_stats_hourly (
+                        channel_id INTEGER,
+                        hour TEXT,
+                        metric TEXT,
+                        value INTEGER DEFAULT 0,
+                        PRIMARY KEY (channel_id, hour, metric)
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE TABLE IF NOT EXISTS channel_members (
+                        channel_username TEXT,
+                        user_id INTEGER,
+                        status TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (channel_username, user_id)
+                    )
+                ''')
+                self.execute_query('''
+                    CREATE INDEX IF NOT EXISTS idx_channel_members_updated
+                    ON channel_members (updated_at)
+                ''')
+                self.execute_query('''
+                    CREATE INDEX IF NOT EXISTS idx_users_premium_until
+                    ON users (premium_until) WHERE is_premium = 1
+                ''')
+                self.execute_query('''
+                    CREATE INDEX IF NOT EXISTS idx_channel_posts_pending
+                    ON channel_posts (is_processed, post_time, id)
+                ''')
                 logger.info("✅ SQLite tables created/verified")
             except Exception as e:
                 logger.error(f"❌ Error creating SQLite tables: {e}")
@@ -267,15 +1717,15 @@ class Database:
         try:
             if self.is_postgres:
                 self.execute_query('''
-                    INSERT INTO users (user_id) 
-                    VALUES (%s)
+                    INSERT INTO users (user_id, created_at) 
+                    VALUES (%s, %s)
                     ON CONFLICT (user_id) DO NOTHING
-                ''', (user_id,))
+                ''', (user_id, clock.now().isoformat()))
             else:
                 self.execute_query('''
-                    INSERT OR IGNORE INTO users (user_id) 
-                    VALUES (?)
-                ''', (user_id,))
+                    INSERT OR IGNORE INTO users (user_id, created_at) 
+                    VALUES (?, ?)
+                ''', (user_id, clock.now().isoformat()))
         except Exception as e:
             logger.error(f"Error creating user {user_id}: {e}")
     
@@ -283,20 +1733,20 @@ class Database:
         try:
             if self.is_postgres:
                 self.execute_query('''
-                    UPDATE users SET has_joined_channels = TRUE, joined_at = CURRENT_TIMESTAMP
+                    UPDATE users SET has_joined_channels = TRUE, joined_at = %s
                     WHERE user_id = %s
-                ''', (user_id,))
+                ''', (clock.now().isoformat(), user_id))
             else:
                 self.execute_query('''
-                    UPDATE users SET has_joined_channels = 1, joined_at = CURRENT_TIMESTAMP
+                    UPDATE users SET has_joined_channels = 1, joined_at = ?
                     WHERE user_id = ?
-                ''', (user_id,))
+                ''', (clock.now().isoformat(), user_id))
         except Exception as e:
             logger.error(f"Error setting user joined channels {user_id}: {e}")
     
     def set_premium(self, user_id, duration_days=30):
         try:
-            premium_until = datetime.now() + timedelta(days=duration_days)
+            premium_until = clock.now() + timedelta(days=duration_days)
             if self.is_postgres:
                 self.execute_query('''
                     INSERT INTO users (user_id, is_premium, premium_until) 
@@ -309,6 +1759,7 @@ class Database:
                     INSERT OR REPLACE INTO users (user_id, is_premium, premium_until) 
                     VALUES (?, 1, ?)
                 ''', (user_id, premium_until.isoformat()))
+            premium_tiers.set(user_id, premium_until)
         except Exception as e:
             logger.error(f"Error setting premium for user {user_id}: {e}")
     
@@ -322,16 +1773,39 @@ class Database:
                     channel_username = EXCLUDED.channel_username,
                     channel_title = EXCLUDED.channel_title,
                     added_by = EXCLUDED.added_by,
-                    added_at = EXCLUDED.added_at
-                ''', (channel_id, channel_username, channel_title, added_by, datetime.now().isoformat()))
+                    added_at = EXCLUDED.added_at,
+                    is_active = TRUE
+                ''', (channel_id, channel_username, channel_title, added_by, clock.now().isoformat()))
             else:
                 self.execute_query('''
                     INSERT OR REPLACE INTO channels (channel_id, channel_username, channel_title, added_by, added_at)
                     VALUES (?, ?, ?, ?, ?)
-                ''', (channel_id, channel_username, channel_title, added_by, datetime.now().isoformat()))
+                ''', (channel_id, channel_username, channel_title, added_by, clock.now().isoformat()))
         except Exception as e:
             logger.error(f"Error adding channel {channel_id}: {e}")
     
+    def get_channel(self, channel_id):
+        """One channel by id, or None"""
+        try:
+            cursor = self.execute_query(
+                'SELECT channel_id, channel_username, channel_title, is_active, auto_react FROM channels WHERE channel_id = %s'
+                if self.is_postgres else
+                'SELECT channel_id, channel_username, channel_title, is_active, auto_react FROM channels WHERE channel_id = ?',
+                (channel_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {
+                'channel_id': row[0],
+                'channel_username': row[1],
+                'channel_title': row[2],
+                'is_active': bool(row[3]),
+                'auto_react': bool(row[4])
+            }
+        except Exception as e:
+            logger.error(f"Error getting channel {channel_id}: {e}")
+            return None
+    
     def get_channels(self):
         try:
             cursor = self.execute_query('''
@@ -363,6 +1837,69 @@ class Database:
             logger.error(f"Error getting channels: {e}")
             return []
     
+    def get_channels_page(self, cursor=None, direction="next", limit=CHANNELS_PAGE_SIZE, auto_react=None, search=None):
+        """One page of active channels by keyset pagination on channel_id.
+        
+        direction is "next" (channel_id > cursor), "at" (>= cursor) or "prev"
+        (< cursor). Returns (channels, has_more) where has_more tells whether
+        another page exists in the direction travelled.
+        """
+        try:
+            ph = '%s' if self.is_postgres else '?'
+            conditions = ['is_active = TRUE' if self.is_postgres else 'is_active = 1']
+            params = []
+            if auto_react is not None:
+                conditions.append(f'auto_react = {ph}')
+                params.append(auto_react if self.is_postgres else int(auto_react))
+            if search:
+                # % and _ typed by the admin are matched literally
+                escaped = search.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                conditions.append(f"LOWER(channel_title) LIKE {ph} ESCAPE '\\'")
+                params.append(f"%{escaped}%")
+            if cursor is not None:
+                operator = {"next": ">", "at": ">=", "prev": "<"}[direction]
+                conditions.append(f'channel_id {operator} {ph}')
+                params.append(cursor)
+            order = 'DESC' if direction == "prev" else 'ASC'
+            params.append(limit + 1)
+            
+            result = self.execute_query(f'''
+                SELECT channel_id, channel_username, channel_title, is_active, auto_react
+                FROM channels
+                WHERE {' AND '.join(conditions)}
+                ORDER BY channel_id {order}
+                LIMIT {ph}
+            ''', tuple(params))
+            rows = result.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if direction == "prev":
+                rows.reverse()
+            return [{
+                'channel_id': row[0],
+                'channel_username': row[1],
+                'channel_title': row[2],
+                'is_active': bool(row[3]),
+                'auto_react': bool(row[4])
+            } for row in rows], has_more
+        except Exception as e:
+            logger.error(f"Error getting channels page: {e}")
+            return [], False
+    
+    def deactivate_channel(self, channel_id):
+        """Stop reacting in a channel the bot was removed from; its history is kept"""
+        try:
+            if self.is_postgres:
+                self.execute_query('''
+                    UPDATE channels SET is_active = FALSE WHERE channel_id = %s
+                ''', (channel_id,))
+            else:
+                self.execute_query('''
+                    UPDATE channels SET is_active = 0 WHERE channel_id = ?
+                ''', (channel_id,))
+        except Exception as e:
+            logger.error(f"Error deactivating channel {channel_id}: {e}")
+    
     def toggle_channel_auto_react(self, channel_id):
         try:
             if self.is_postgres:
@@ -385,17 +1922,17 @@ class Database:
             if self.is_postgres:
                 cursor = self.execute_query('''
                     INSERT INTO permanent_reactions 
-                    (user_id, target_message_id, target_chat_id, reactions_applied)
-                    VALUES (%s, %s, %s, %s)
+                    (user_id, target_message_id, target_chat_id, reactions_applied, applied_at)
+                    VALUES (%s, %s, %s, %s, %s)
                     RETURNING id
-                ''', (user_id, target_message_id, target_chat_id, reactions_json))
+                ''', (user_id, target_message_id, target_chat_id, reactions_json, clock.now().isoformat()))
                 return cursor.fetchone()[0]
             else:
                 cursor = self.execute_query('''
                     INSERT INTO permanent_reactions 
-                    (user_id, target_message_id, target_chat_id, reactions_applied)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, target_message_id, target_chat_id, reactions_json))
+                    (user_id, target_message_id, target_chat_id, reactions_applied, applied_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, target_message_id, target_chat_id, reactions_json, clock.now().isoformat()))
                 return cursor.lastrowid
         except Exception as e:
             logger.error(f"Error logging permanent reaction: {e}")
@@ -405,18 +1942,18 @@ class Database:
         try:
             if self.is_postgres:
                 cursor = self.execute_query('''
-                    INSERT INTO channel_posts (channel_id, message_id)
-                    VALUES (%s, %s)
+                    INSERT INTO channel_posts (channel_id, message_id, post_time)
+                    VALUES (%s, %s, %s)
                     ON CONFLICT DO NOTHING
                     RETURNING id
-                ''', (channel_id, message_id))
+                ''', (channel_id, message_id, clock.now().isoformat()))
                 result = cursor.fetchone()
                 return result[0] if result else None
             else:
                 cursor = self.execute_query('''
-                    INSERT OR IGNORE INTO channel_posts (channel_id, message_id)
-                    VALUES (?, ?)
-                ''', (channel_id, message_id))
+                    INSERT OR IGNORE INTO channel_posts (channel_id, message_id, post_time)
+                    VALUES (?, ?, ?)
+                ''', (channel_id, message_id, clock.now().isoformat()))
                 return cursor.lastrowid
         except Exception as e:
             logger.error(f"Error logging channel post: {e}")
@@ -430,49 +1967,204 @@ class Database:
                     SET is_processed = TRUE, reactions_sent = %s, permanent_reaction_id = %s
                     WHERE id = %s
                 ''', (reactions_sent, permanent_reaction_id, post_id))
+                self.execute_query('DELETE FROM delivery_retries WHERE post_id = %s', (post_id,))
             else:
                 self.execute_query('''
                     UPDATE channel_posts 
                     SET is_processed = 1, reactions_sent = ?, permanent_reaction_id = ?
                     WHERE id = ?
                 ''', (reactions_sent, permanent_reaction_id, post_id))
+                self.execute_query('DELETE FROM delivery_retries WHERE post_id = ?', (post_id,))
         except Exception as e:
             logger.error(f"Error marking post processed {post_id}: {e}")
     
-    def get_pending_posts(self):
+    def checkpoint_post(self, post_id, reactions_sent):
+        """Record partial progress on a post that is still unprocessed"""
+        try:
+            if self.is_postgres:
+                self.execute_query('''
+                    UPDATE channel_posts SET reactions_sent = %s WHERE id = %s
+                ''', (reactions_sent, post_id))
+            else:
+                self.execute_query('''
+                    UPDATE channel_posts SET reactions_sent = ? WHERE id = ?
+                ''', (reactions_sent, post_id))
+        except Exception as e:
+            logger.error(f"Error checkpointing post {post_id}: {e}")
+    
+    def get_pending_posts(self, after=None, limit=PENDING_POSTS_BATCH, newer_than=None, older_than=None, newest_first=False,
+                          shard=None):
+        """Next batch of due pending posts in (post_time, id) order, starting after a keyset position.
+        
+        newer_than/older_than restrict the batch to one side of a post_time
+        cutoff; newest_first walks the keyset in descending order; shard is
+        (index, count) and keeps only that delivery process's channels.
+        """
+        try:
+            # Posts waiting out a retry backoff are skipped until they are due
+            if self.is_postgres:
+                query = '''
+                    SELECT cp.id, cp.channel_id, cp.message_id, c.channel_title, cp.reactions_sent, cp.post_time
+                    FROM channel_posts cp
+                    JOIN channels c ON cp.channel_id = c.channel_id
+                    LEFT JOIN delivery_retries r ON r.post_id = cp.id
+                    WHERE cp.is_processed = FALSE AND c.auto_react = TRUE AND c.is_active = TRUE
+                    AND (r.next_attempt_at IS NULL OR r.next_attempt_at <= %s)
+                '''
+                params = [clock.now().isoformat()]
+                if newer_than:
+                    query += ' AND cp.post_time >= %s'
+                    params.append(newer_than.isoformat())
+                if older_than:
+                    query += ' AND cp.post_time < %s'
+                    params.append(older_than.isoformat())
+                if shard:
+                    query += ' AND ABS(cp.channel_id) %% %s = %s'
+                    params.extend((shard[1], shard[0]))
+                if after:
+                    query += ' AND (cp.post_time, cp.id) < (%s, %s)' if newest_first else ' AND (cp.post_time, cp.id) > (%s, %s)'
+                    params.extend(after)
+                query += ' ORDER BY cp.post_time DESC, cp.id DESC LIMIT %s' if newest_first else ' ORDER BY cp.post_time, cp.id LIMIT %s'
+            else:
+                query = '''
+                    SELECT cp.id, cp.channel_id, cp.message_id, c.channel_title, cp.reactions_sent, cp.post_time
+                    FROM channel_posts cp
+                    JOIN channels c ON cp.channel_id = c.channel_id
+                    LEFT JOIN delivery_retries r ON r.post_id = cp.id
+                    WHERE cp.is_processed = 0 AND c.auto_react = 1 AND c.is_active = 1
+                    AND (r.next_attempt_at IS NULL OR r.next_attempt_at <= ?)
+                '''
+                params = [clock.now().isoformat()]
+                if newer_than:
+                    query += ' AND cp.post_time >= ?'
+                    params.append(newer_than.isoformat())
+                if older_than:
+                    query += ' AND cp.post_time < ?'
+                    params.append(older_than.isoformat())
+                if shard:
+                    query += ' AND ABS(cp.channel_id) % ? = ?'
+                    params.extend((shard[1], shard[0]))
+                if after:
+                    query += ' AND (cp.post_time, cp.id) < (?, ?)' if newest_first else ' AND (cp.post_time, cp.id) > (?, ?)'
+                    params.extend(after)
+                query += ' ORDER BY cp.post_time DESC, cp.id DESC LIMIT ?' if newest_first else ' ORDER BY cp.post_time, cp.id LIMIT ?'
+            params.append(limit)
+            cursor = self.execute_query(query, tuple(params))
+            return [PendingPost(*row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting pending posts: {e}")
+            return []
+    
+    def count_channels(self):
+        """Active channel counts without loading the rows"""
         try:
             cursor = self.execute_query('''
-                SELECT cp.id, cp.channel_id, cp.message_id, c.channel_title
-                FROM channel_posts cp
-                JOIN channels c ON cp.channel_id = c.channel_id
-                WHERE cp.is_processed = FALSE AND c.auto_react = TRUE
-                ORDER BY cp.post_time ASC
+                SELECT COUNT(*), SUM(CASE WHEN auto_react THEN 1 ELSE 0 END)
+                FROM channels WHERE is_active = TRUE
             ''' if self.is_postgres else '''
-                SELECT cp.id, cp.channel_id, cp.message_id, c.channel_title
-                FROM channel_posts cp
-                JOIN channels c ON cp.channel_id = c.channel_id
-                WHERE cp.is_processed = 0 AND c.auto_react = 1
-                ORDER BY cp.post_time ASC
+                SELECT COUNT(*), SUM(CASE WHEN auto_react THEN 1 ELSE 0 END)
+                FROM channels WHERE is_active = 1
             ''')
-            return [{
-                'id': row[0],
-                'channel_id': row[1],
-                'message_id': row[2],
-                'channel_title': row[3]
-            } for row in cursor.fetchall()]
+            result = cursor.fetchone()
+            return {'total': result[0] or 0, 'auto_react': result[1] or 0}
         except Exception as e:
-            logger.error(f"Error getting pending posts: {e}")
+            logger.error(f"Error counting channels: {e}")
+            return {'total': 0, 'auto_react': 0}
+    
+    def count_pending_posts(self):
+        try:
+            cursor = self.execute_query(
+                'SELECT COUNT(*) FROM channel_posts WHERE is_processed = FALSE' if self.is_postgres else
+                'SELECT COUNT(*) FROM channel_posts WHERE is_processed = 0')
+            return cursor.fetchone()[0] or 0
+        except Exception as e:
+            logger.error(f"Error counting pending posts: {e}")
+            return 0
+    
+    def skip_stale_posts(self, cutoff, shard=None):
+        """Give up on unprocessed posts made before cutoff; returns how many were skipped.
+        
+        shard is (index, count) like in get_pending_posts, so each delivery
+        process only gives up on its own channels' posts.
+        """
+        try:
+            cutoff = cutoff.isoformat()
+            # Retry rows are dropped first, looked up from delivery_retries, while the posts are still pending
+            if self.is_postgres:
+                retries_query = '''
+                    DELETE FROM delivery_retries r USING channel_posts cp
+                    WHERE cp.id = r.post_id AND cp.is_processed = FALSE AND cp.post_time < %s
+                '''
+                skip_query = '''
+                    UPDATE channel_posts SET is_processed = TRUE
+                    WHERE is_processed = FALSE AND post_time < %s
+                '''
+                if shard:
+                    retries_query += ' AND ABS(r.channel_id) %% %s = %s'
+                    skip_query += ' AND ABS(channel_id) %% %s = %s'
+            else:
+                retries_query = '''
+                    DELETE FROM delivery_retries WHERE EXISTS
+                    (SELECT 1 FROM channel_posts cp WHERE cp.id = delivery_retries.post_id
+                     AND cp.is_processed = 0 AND cp.post_time < ?)
+                '''
+                skip_query = '''
+                    UPDATE channel_posts SET is_processed = 1
+                    WHERE is_processed = 0 AND post_time < ?
+                '''
+                if shard:
+                    retries_query += ' AND ABS(channel_id) % ? = ?'
+                    skip_query += ' AND ABS(channel_id) % ? = ?'
+            params = (cutoff, shard[1], shard[0]) if shard else (cutoff,)
+            with self.lock:
+                self.execute_query(retries_query, params)
+                cursor = self.execute_query(skip_query, params)
+            return cursor.rowcount or 0
+        except Exception as e:
+            logger.error(f"Error skipping stale posts: {e}")
+            return 0
+    
+    def get_backlog_stats(self, stale_cutoff=None):
+        """Unprocessed post count, oldest post age and (with a cutoff) how many are stale"""
+        try:
+            cursor = self.execute_query('''
+                SELECT COUNT(*), MIN(post_time), SUM(CASE WHEN post_time < %s THEN 1 ELSE 0 END)
+                FROM channel_posts WHERE is_processed = FALSE
+            ''' if self.is_postgres else '''
+                SELECT COUNT(*), MIN(post_time), SUM(CASE WHEN post_time < ? THEN 1 ELSE 0 END)
+                FROM channel_posts WHERE is_processed = 0
+            ''', ((stale_cutoff or datetime.min).isoformat(),))
+            count, oldest, stale = cursor.fetchone()
+            oldest = _to_datetime(oldest)
+            return {
+                'pending': count or 0,
+                'oldest_age_seconds': round((clock.now() - oldest).total_seconds()) if oldest else 0,
+                'stale': stale or 0
+            }
+        except Exception as e:
+            logger.error(f"Error getting backlog stats: {e}")
+            return {'pending': 0, 'oldest_age_seconds': 0, 'stale': 0}
+    
+    def get_recent_post_keys(self, limit):
+        """(channel_id, message_id) of the newest posts, oldest first"""
+        try:
+            cursor = self.execute_query(
+                'SELECT channel_id, message_id FROM channel_posts ORDER BY id DESC LIMIT %s' if self.is_postgres else
+                'SELECT channel_id, message_id FROM channel_posts ORDER BY id DESC LIMIT ?', (limit,))
+            return [(row[0], row[1]) for row in reversed(cursor.fetchall())]
+        except Exception as e:
+            logger.error(f"Error getting recent post keys: {e}")
             return []
     
     def get_post_reaction_stats(self, user_id, target_message_id, target_chat_id):
-        """Get reaction statistics for a specific post within the 5-minute window"""
+        """Reactions applied to a specific post within the 5-minute window"""
         try:
             # Calculate time window
-            window_start = datetime.now() - timedelta(minutes=TIME_WINDOW_MINUTES)
+            window_start = clock.now() - timedelta(minutes=TIME_WINDOW_MINUTES)
             
             if self.is_postgres:
                 cursor = self.execute_query('''
-                    SELECT COUNT(*) FROM permanent_reactions 
+                    SELECT COALESCE(SUM(json_array_length(reactions_applied::json)), 0) FROM permanent_reactions 
                     WHERE user_id = %s 
                     AND target_message_id = %s
                     AND target_chat_id = %s
@@ -481,7 +2173,7 @@ class Database:
                 ''', (user_id, target_message_id, target_chat_id, window_start.isoformat()))
             else:
                 cursor = self.execute_query('''
-                    SELECT COUNT(*) FROM permanent_reactions 
+                    SELECT COALESCE(SUM(json_array_length(reactions_applied)), 0) FROM permanent_reactions 
                     WHERE user_id = ? 
                     AND target_message_id = ?
                     AND target_chat_id = ?
@@ -504,22 +2196,8 @@ class Database:
             if not user:
                 return False
             
-            # Get user's reaction limit
-            if user_id in ADMIN_IDS:
-                max_reactions = PREMIUM_REACTIONS_PER_POST
-            elif user['is_premium']:
-                # Check if premium subscription is still valid
-                if user['premium_until']:
-                    premium_until = datetime.fromisoformat(user['premium_until'])
-                    if datetime.now() > premium_until:
-                        self.remove_premium(user_id)
-                        max_reactions = REGULAR_REACTIONS_PER_POST
-                    else:
-                        max_reactions = PREMIUM_REACTIONS_PER_POST
-                else:
-                    max_reactions = REGULAR_REACTIONS_PER_POST
-            else:
-                max_reactions = REGULAR_REACTIONS_PER_POST
+            # Get user's reaction limit (expiry is handled by the premium sweeper)
+            max_reactions = premium_tiers.limit(user_id)
             
             # Get current reaction count for this post in the last 5 minutes
             current_reactions = self.get_post_reaction_stats(user_id, target_message_id, target_chat_id)
@@ -541,34 +2219,607 @@ class Database:
                     UPDATE users SET is_premium = 0, premium_until = NULL 
                     WHERE user_id = ?
                 ''', (user_id,))
+            premium_tiers.remove(user_id)
         except Exception as e:
             logger.error(f"Error removing premium for user {user_id}: {e}")
     
+    def set_channel_member(self, channel_username, user_id, status):
+        """Record a user's current status in one of the required channels"""
+        try:
+            if self.is_postgres:
+                self.execute_query('''
+                    INSERT INTO channel_members (channel_username, user_id, status, updated_at)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (channel_username, user_id) DO UPDATE SET
+                    status = EXCLUDED.status, updated_at = EXCLUDED.updated_at
+                ''', (channel_username.lower(), user_id, status, clock.now().isoformat()))
+            else:
+                self.execute_query('''
+                    INSERT OR REPLACE INTO channel_members (channel_username, user_id, status, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (channel_username.lower(), user_id, status, clock.now().isoformat()))
+        except Exception as e:
+            logger.error(f"Error setting channel member {user_id} in @{channel_username}: {e}")
+    
+    def get_member_statuses(self, user_id):
+        """{channel_username: status} for the channels we have seen this user in"""
+        try:
+            cursor = self.execute_query(
+                'SELECT channel_username, status FROM channel_members WHERE user_id = %s' if self.is_postgres else
+                'SELECT channel_username, status FROM channel_members WHERE user_id = ?', (user_id,))
+            return {row[0]: row[1] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting member statuses for {user_id}: {e}")
+            return {}
+    
+    def get_stale_members(self, older_than, limit):
+        """Users whose oldest membership row predates older_than, stalest first"""
+        try:
+            cursor = self.execute_query('''
+                SELECT user_id FROM channel_members
+                WHERE updated_at < %s
+                GROUP BY user_id ORDER BY MIN(updated_at) LIMIT %s
+            ''' if self.is_postgres else '''
+                SELECT user_id FROM channel_members
+                WHERE updated_at < ?
+                GROUP BY user_id ORDER BY MIN(updated_at) LIMIT ?
+            ''', (older_than.isoformat(), limit))
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting stale members: {e}")
+            return []
+    
+    def get_premium_users(self):
+        """(user_id, premium_until) for every premium user"""
+        try:
+            cursor = self.execute_query(
+                'SELECT user_id, premium_until FROM users WHERE is_premium = TRUE AND premium_until IS NOT NULL'
+                if self.is_postgres else
+                'SELECT user_id, premium_until FROM users WHERE is_premium = 1 AND premium_until IS NOT NULL')
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting premium users: {e}")
+            return []
+    
+    def expire_premium_batch(self, limit=PREMIUM_SWEEP_BATCH):
+        """Clear premium for up to limit users whose premium_until has passed; returns their ids"""
+        try:
+            now = clock.now()
+            cursor = self.execute_query('''
+                SELECT user_id FROM users
+                WHERE is_premium = TRUE AND premium_until <= %s
+                ORDER BY premium_until LIMIT %s
+            ''' if self.is_postgres else '''
+                SELECT user_id FROM users
+                WHERE is_premium = 1 AND premium_until <= ?
+                ORDER BY premium_until LIMIT ?
+            ''', (now if self.is_postgres else now.isoformat(), limit))
+            user_ids = [row[0] for row in cursor.fetchall()]
+            if not user_ids:
+                return []
+            
+            ph = '%s' if self.is_postgres else '?'
+            placeholders = ', '.join([ph] * len(user_ids))
+            self.execute_query(f'''
+                UPDATE users SET is_premium = {'FALSE' if self.is_postgres else '0'}, premium_until = NULL
+                WHERE user_id IN ({placeholders})
+            ''', tuple(user_ids))
+            for user_id in user_ids:
+                premium_tiers.remove(user_id)
+            return user_ids
+        except Exception as e:
+            logger.error(f"Error expiring premium users: {e}")
+            return []
+    
+    def record_delivery_failure(self, post, error_class, error_text, retry_after=None):
+        """Schedule a backoff retry for a failed post, or dead-letter it.
+        
+        Returns the delay in seconds until the next attempt, or None if the
+        post was moved to dead_letters. Database errors are raised so a failed
+        write is never mistaken for either outcome.
+        """
+        cursor = self.execute_query(
+            'SELECT attempts FROM delivery_retries WHERE post_id = %s' if self.is_postgres else
+            'SELECT attempts FROM delivery_retries WHERE post_id = ?', (post.id,))
+        result = cursor.fetchone()
+        attempts = result[0] if result else 0
+        # Rate limits are not the post's fault and don't use up attempts
+        if error_class != RATE_LIMITED:
+            attempts += 1
+        
+        if error_class == PERMANENT or attempts >= RETRY_MAX_ATTEMPTS:
+            self.dead_letter_post(post, attempts, error_class, error_text)
+            return None
+        
+        delay = retry_delay(max(attempts, 1), retry_after)
+        next_attempt_at = (clock.now() + timedelta(seconds=delay)).isoformat()
+        if self.is_postgres:
+            self.execute_query('''
+                INSERT INTO delivery_retries
+                (post_id, channel_id, message_id, attempts, next_attempt_at, error_class, last_error, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (post_id) DO UPDATE SET
+                attempts = EXCLUDED.attempts, next_attempt_at = EXCLUDED.next_attempt_at,
+                error_class = EXCLUDED.error_class, last_error = EXCLUDED.last_error,
+                updated_at = EXCLUDED.updated_at
+            ''', (post.id, post.channel_id, post.message_id, attempts, next_attempt_at,
+                  error_class, error_text, clock.now().isoformat()))
+        else:
+            self.execute_query('''
+                INSERT OR REPLACE INTO delivery_retries
+                (post_id, channel_id, message_id, attempts, next_attempt_at, error_class, last_error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (post.id, post.channel_id, post.message_id, attempts, next_attempt_at,
+                  error_class, error_text, clock.now().isoformat()))
+        return delay
+    
+    def dead_letter_post(self, post, attempts, error_class, error_text):
+        """Give up on a post: keep it in dead_letters and take it out of the pending set"""
+        if self.is_postgres:
+            self.execute_query('''
+                INSERT INTO dead_letters (post_id, channel_id, message_id, attempts, error_class, last_error, failed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ''', (post.id, post.channel_id, post.message_id, attempts, error_class, error_text,
+                  clock.now().isoformat()))
+        else:
+            self.execute_query('''
+                INSERT INTO dead_letters (post_id, channel_id, message_id, attempts, error_class, last_error, failed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (post.id, post.channel_id, post.message_id, attempts, error_class, error_text,
+                  clock.now().isoformat()))
+        self.mark_post_processed(post.id, post.reactions_sent)
+    
+    def get_dead_letters(self, limit=10):
+        try:
+            cursor = self.execute_query('''
+                SELECT post_id, channel_id, message_id, attempts, error_class, last_error, failed_at
+                FROM dead_letters ORDER BY id DESC LIMIT %s
+            ''' if self.is_postgres else '''
+                SELECT post_id, channel_id, message_id, attempts, error_class, last_error, failed_at
+                FROM dead_letters ORDER BY id DESC LIMIT ?
+            ''', (limit,))
+            return [{
+                'post_id': row[0],
+                'channel_id': row[1],
+                'message_id': row[2],
+                'attempts': row[3],
+                'error_class': row[4],
+                'last_error': row[5],
+                'failed_at': row[6]
+            } for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting dead letters: {e}")
+            return []
+    
+    def get_retry_stats(self):
+        try:
+            retrying = self.execute_query('SELECT COUNT(*) FROM delivery_retries').fetchone()[0]
+            dead = self.execute_query('SELECT COUNT(*) FROM dead_letters').fetchone()[0]
+            return {'retrying': retrying, 'dead_letters': dead}
+        except Exception as e:
+            logger.error(f"Error getting retry stats: {e}")
+            return {'retrying': 0, 'dead_letters': 0}
+    
+    def enqueue_react_job(self, job):
+        """Queue a /react job for the delivery processes; returns its id"""
+        try:
+            params = (job.user_id, job.chat_id, job.message_id, job.num_reactions,
+                      job.status_chat_id, job.status_message_id, clock.now().isoformat())
+            if self.is_postgres:
+                cursor = self.execute_query('''
+                    INSERT INTO react_jobs (user_id, chat_id, message_id, num_reactions, status_chat_id, status_message_id, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                ''', params)
+                return cursor.fetchone()[0]
+            else:
+                cursor = self.execute_query('''
+                    INSERT INTO react_jobs (user_id, chat_id, message_id, num_reactions, status_chat_id, status_message_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', params)
+                return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"Error queueing react job: {e}")
+            return None
+    
+    def get_react_job_load(self, user_id, chat_id, message_id):
+        """(reactions reserved by queued/running jobs on this post, the user's jobs, all jobs)"""
+        ph = '%s' if self.is_postgres else '?'
+        reserved = self.execute_query(f'''
+            SELECT COALESCE(SUM(num_reactions), 0) FROM react_jobs
+            WHERE user_id = {ph} AND chat_id = {ph} AND message_id = {ph}
+        ''', (user_id, chat_id, message_id)).fetchone()[0]
+        user_jobs = self.execute_query(f'SELECT COUNT(*) FROM react_jobs WHERE user_id = {ph}', (user_id,)).fetchone()[0]
+        total = self.execute_query('SELECT COUNT(*) FROM react_jobs').fetchone()[0]
+        return int(reserved), user_jobs, total
+    
+    def claim_react_job(self, shard):
+        """Mark the oldest waiting job of this shard's chats running and return it.
+        
+        Only one delivery process works on a shard, so select-then-update is safe.
+        """
+        try:
+            ph = '%s' if self.is_postgres else '?'
+            mod = '%%' if self.is_postgres else '%'
+            row = self.execute_query(f'''
+                SELECT id, user_id, chat_id, message_id, num_reactions, status_chat_id, status_message_id
+                FROM react_jobs
+                WHERE is_running = {'FALSE' if self.is_postgres else '0'} AND ABS(chat_id) {mod} {ph} = {ph}
+                ORDER BY id LIMIT 1
+            ''', (shard[1], shard[0])).fetchone()
+            if not row:
+                return None
+            self.execute_query(f'''
+                UPDATE react_jobs SET is_running = {'TRUE' if self.is_postgres else '1'} WHERE id = {ph}
+            ''', (row[0],))
+            return ReactJob(row[1], row[2], row[3], row[4], job_id=row[0], status_chat_id=row[5], status_message_id=row[6])
+        except Exception as e:
+            logger.error(f"Error claiming react job: {e}")
+            return None
+    
+    def take_interrupted_react_jobs(self, shard):
+        """Remove and return this shard's jobs that were running when its process stopped"""
+        try:
+            ph = '%s' if self.is_postgres else '?'
+            mod = '%%' if self.is_postgres else '%'
+            rows = self.execute_query(f'''
+                SELECT id, user_id, chat_id, message_id, num_reactions, status_chat_id, status_message_id
+                FROM react_jobs
+                WHERE is_running = {'TRUE' if self.is_postgres else '1'} AND ABS(chat_id) {mod} {ph} = {ph}
+            ''', (shard[1], shard[0])).fetchall()
+            for row in rows:
+                self.delete_react_job(row[0])
+            return [ReactJob(row[1], row[2], row[3], row[4], job_id=row[0], status_chat_id=row[5], status_message_id=row[6])
+                    for row in rows]
+        except Exception as e:
+            logger.error(f"Error reading interrupted react jobs: {e}")
+            return []
+    
+    def delete_react_job(self, job_id):
+        try:
+            self.execute_query('DELETE FROM react_jobs WHERE id = %s' if self.is_postgres else
+                               'DELETE FROM react_jobs WHERE id = ?', (job_id,))
+        except Exception as e:
+            logger.error(f"Error deleting react job {job_id}: {e}")
+    
+    def add_counters(self, deltas):
+        """Add counter deltas {(day, channel_id, tier, metric): amount} in one upsert"""
+        rows = [(day, channel_id, tier, metric, amount) for (day, channel_id, tier, metric), amount in deltas.items()]
+        if not rows:
+            return
+        self.execute_many('''
+            INSERT INTO counters (day, channel_id, tier, metric, value)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (day, channel_id, tier, metric) DO UPDATE SET
+            value = counters.value + EXCLUDED.value
+        ''' if self.is_postgres else '''
+            INSERT INTO counters (day, channel_id, tier, metric, value)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (day, channel_id, tier, metric) DO UPDATE SET
+            value = counters.value + excluded.value
+        ''', rows)
+    
+    def get_counter_totals(self):
+        """All-time totals per metric"""
+        try:
+            cursor = self.execute_query('SELECT metric, SUM(value) FROM counters GROUP BY metric')
+            return {row[0]: int(row[1] or 0) for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting counter totals: {e}")
+            return {}
+    
+    def add_channel_stats(self, deltas):
+        """Add hourly channel stat deltas {(hour, channel_id, metric): amount} in one upsert"""
+        rows = [(channel_id, hour, metric, amount) for (hour, channel_id, metric), amount in deltas.items()]
+        if not rows:
+            return
+        self.execute_many('''
+            INSERT INTO channel_stats_hourly (channel_id, hour, metric, value)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (channel_id, hour, metric) DO UPDATE SET
+            value = channel_stats_hourly.value + EXCLUDED.value
+        ''' if self.is_postgres else '''
+            INSERT INTO channel_stats_hourly (channel_id, hour, metric, value)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (channel_id, hour, metric) DO UPDATE SET
+            value = channel_stats_hourly.value + excluded.value
+        ''', rows)
+    
+    def get_channel_stats(self, channel_id, since):
+        """Metric totals for a channel from the hour containing `since` on"""
+        try:
+            cursor = self.execute_query('''
+                SELECT metric, SUM(value) FROM channel_stats_hourly
+                WHERE channel_id = %s AND hour >= %s GROUP BY metric
+            ''' if self.is_postgres else '''
+                SELECT metric, SUM(value) FROM channel_stats_hourly
+                WHERE channel_id = ? AND hour >= ? GROUP BY metric
+            ''', (channel_id, since.strftime("%Y-%m-%dT%H")))
+            return {row[0]: int(row[1] or 0) for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting stats for channel {channel_id}: {e}")
+            return {}
+    
+    def get_counter_summary(self, since_day=None):
+        """Totals per (metric, tier), optionally from since_day (YYYY-MM-DD) on"""
+        try:
+            if since_day:
+                cursor = self.execute_query('''
+                    SELECT metric, tier, SUM(value) FROM counters WHERE day >= %s GROUP BY metric, tier
+                ''' if self.is_postgres else '''
+                    SELECT metric, tier, SUM(value) FROM counters WHERE day >= ? GROUP BY metric, tier
+                ''', (since_day,))
+            else:
+                cursor = self.execute_query('SELECT metric, tier, SUM(value) FROM counters GROUP BY metric, tier')
+            return {(row[0], row[1]): int(row[2] or 0) for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting counter summary: {e}")
+            return {}
+    
+    def iter_export_rows(self, table, after_id=0, chunk_size=EXPORT_CHUNK_ROWS):
+        """Yield chunks of rows from an EXPORT_TABLES table with id > after_id, in id order.
+        
+        PostgreSQL streams through a server-side (named) cursor; SQLite fetches
+        one keyset page per chunk. Neither holds more than a chunk in memory.
+        """
+        columns = ", ".join(EXPORT_TABLES[table])
+        if self.is_postgres:
+            cursor = self.conn.cursor(name=f"export_{table}_{int(time.time() * 1000)}", withhold=True)
+            cursor.itersize = chunk_size
+            try:
+                cursor.execute(f'SELECT {columns} FROM {table} WHERE id > %s ORDER BY id', (after_id,))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+                self.conn.commit()
+        else:
+            while True:
+                rows = self.execute_query(
+                    f'SELECT {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?', (after_id, chunk_size)
+                ).fetchall()
+                if not rows:
+                    break
+                yield rows
+                after_id = rows[-1][0]
+    
     def cleanup_old_records(self):
         """Clean up old records but keep permanent reactions"""
         try:
-            cutoff_time = datetime.now() - timedelta(days=7)
+            cutoff_time = clock.now() - timedelta(days=7)
+            dead_letter_cutoff = clock.now() - timedelta(days=DEAD_LETTER_RETENTION_DAYS)
+            stats_cutoff = (clock.now() - timedelta(days=CHANNEL_STATS_RETENTION_DAYS)).strftime("%Y-%m-%dT%H")
             if self.is_postgres:
                 self.execute_query('DELETE FROM channel_posts WHERE post_time < %s', (cutoff_time.isoformat(),))
+                self.execute_query('DELETE FROM dead_letters WHERE failed_at < %s', (dead_letter_cutoff.isoformat(),))
+                self.execute_query('DELETE FROM channel_stats_hourly WHERE hour < %s', (stats_cutoff,))
             else:
                 self.execute_query('DELETE FROM channel_posts WHERE post_time < ?', (cutoff_time.isoformat(),))
+                self.execute_query('DELETE FROM dead_letters WHERE failed_at < ?', (dead_letter_cutoff.isoformat(),))
+                self.execute_query('DELETE FROM channel_stats_hourly WHERE hour < ?', (stats_cutoff,))
+            self.execute_query('DELETE FROM delivery_retries WHERE post_id NOT IN (SELECT id FROM channel_posts)')
         except Exception as e:
             logger.error(f"Error cleaning up old records: {e}")
 
-# Initialize database
+# Initialize database (connected during bot startup)
 db = Database()
 
 class ReactionBot:
-    def __init__(self, token):
+    def __init__(self, token, role=BOT_ROLE):
         self.token = token
-        self.application = Application.builder().token(token).build()
-        self.bot = Bot(token)
+        self.role = role
+        self.shard = (DELIVERY_SHARD, DELIVERY_PROCESSES) if role == "delivery" else None
+        self.http = BotHTTP()
+        self.update_processor = OrderedUpdateProcessor()
+        self.application = (
+            Application.builder()
+            .token(token)
+            .request(self.http.api_request)
+            .get_updates_request(self.http.long_poll_request)
+            .concurrent_updates(self.update_processor)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
+        # All Bot API calls go through the Application's bot and its shared pool
+        self.bot = self.application.bot
+        # Background /react jobs
+        self.react_queue = asyncio.Queue(maxsize=REACT_QUEUE_SIZE)
+        self.pending_jobs: Dict[int, int] = {}
+        self.reserved_reactions: Dict[tuple, int] = {}
+        self.recent_posts = RecentPosts(RECENT_POSTS_CAPACITY)
+        self.busy_job_workers = 0
+        self.export_lock = asyncio.Lock()
+        self.profile_lock = asyncio.Lock()
+        self.tracemalloc_baseline = None
+        self.required_usernames = {channel['username'].lower() for channel in REQUIRED_CHANNELS}
+        self.supervisor = TaskSupervisor()
+        self.loop_monitor = LoopLagMonitor()
+        self.reaction_catalog = ReactionCatalog()
+        self.breakers = CircuitBreaker()
+        # Ingest never sees a post finish in multi-process mode; delivery processes sample at dequeue instead
+        self.tracer = PostTracer(sample_rate=0 if role == "ingest" else TRACE_SAMPLE_RATE)
+        # The catch-up cap is for the whole bot, so delivery processes split it between them
+        drain_rate = DRAIN_BACKLOG_PER_MINUTE / DELIVERY_PROCESSES if role == "delivery" else DRAIN_BACKLOG_PER_MINUTE
+        self.drain_limiter = RateLimiter(drain_rate) if drain_rate else None
+        self.drain_deferred = 0
+        self.last_ingest_at = 0.0
+        self.drain_restart = False
+        self.stop_event = asyncio.Event()
+        self.web_runner = None
         self.setup_handlers()
-        # Start background tasks
-        asyncio.create_task(self.periodic_cleanup())
-        asyncio.create_task(self.process_channel_posts())
-        asyncio.create_task(self.health_check_loop())
-        asyncio.create_task(self.keep_alive_loop())
+    
+    async def post_init(self, application: Application):
+        """Startup pipeline: connect and migrate, warm caches, start background tasks"""
+        timings = {}
+        
+        phase_started = time.monotonic()
+        await asyncio.to_thread(db.connect)
+        timings['database'] = time.monotonic() - phase_started
+        
+        phase_started = time.monotonic()
+        await self.warm_caches()
+        timings['caches'] = time.monotonic() - phase_started
+        
+        phase_started = time.monotonic()
+        self.start_background_tasks()
+        timings['background_tasks'] = time.monotonic() - phase_started
+        
+        phases = ", ".join(f"{name}: {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+        logger.info(f"🚀 Startup complete in {(time.monotonic() - PROCESS_STARTED) * 1000:.0f} ms ({phases})")
+    
+    async def warm_caches(self):
+        """Warm caches while the web server comes up"""
+        await asyncio.gather(
+            self.start_web_server(),
+            asyncio.to_thread(self.load_caches),
+        )
+        # Probes can answer as soon as the web server is up
+        await self.refresh_health_snapshot()
+    
+    def load_caches(self):
+        """Cache loads run one after another in a single thread: they share db.conn"""
+        self.restore_state()
+        self.seed_recent_posts()
+        self.load_premium_tiers()
+    
+    def seed_recent_posts(self):
+        self.recent_posts.seed(db.get_recent_post_keys(RECENT_POSTS_CAPACITY))
+        logger.info(f"🧠 Seeded {len(self.recent_posts)} recent posts for dedupe")
+    
+    def load_premium_tiers(self):
+        premium_tiers.load(db.get_premium_users())
+        logger.info(f"⭐ Loaded {len(premium_tiers)} premium users")
+    
+    def restore_state(self):
+        counters.restore(db.get_counter_totals())
+    
+    def start_background_tasks(self):
+        self.supervisor.start("loop_lag_monitor", self.loop_monitor.run)
+        if LOOP_BLOCK_DETECTOR:
+            self.loop_monitor.start_block_detector(asyncio.get_running_loop())
+        self.supervisor.start("counter_flush_loop", self.counter_flush_loop)
+        if TRACE_OTLP_ENDPOINT:
+            self.supervisor.start("trace_export_loop", self.trace_export_loop)
+        if self.role != "ingest":
+            self.supervisor.start("process_channel_posts", self.process_channel_posts)
+        if self.role == "delivery":
+            for i in range(REACT_JOB_WORKERS):
+                self.supervisor.start(f"react_job_worker_{i + 1}", self.persisted_job_worker)
+            return
+        
+        self.supervisor.start("periodic_cleanup", self.periodic_cleanup)
+        self.supervisor.start("health_check_loop", self.health_check_loop)
+        self.supervisor.start("premium_sweeper", self.premium_sweeper)
+        if MEMBERSHIP_MODE == "events":
+            self.supervisor.start("membership_reconciler", self.membership_reconciler)
+        self.supervisor.start("keep_alive_loop", self.keep_alive_loop)
+        # In multi-process mode /react jobs run in the delivery processes
+        if self.role == "all":
+            for i in range(REACT_JOB_WORKERS):
+                self.supervisor.start(f"react_job_worker_{i + 1}", self.react_job_worker)
+    
+    async def post_stop(self, application: Application):
+        """Runs after polling stopped (e.g. SIGTERM): drain in-flight work"""
+        await self.drain(SHUTDOWN_DRAIN_SECONDS)
+    
+    async def drain(self, timeout):
+        """Stop taking new work and let in-flight and queued work finish within timeout"""
+        logger.info(f"🛑 Shutting down: draining in-flight work (up to {timeout:.0f}s)")
+        self.stop_event.set()
+        
+        waiters = [asyncio.ensure_future(self.react_queue.join())]
+        channel_worker = self.supervisor.tasks.get("process_channel_posts")
+        if channel_worker:
+            waiters.append(channel_worker)
+        
+        done, pending = await asyncio.wait(waiters, timeout=timeout)
+        if pending:
+            logger.warning("⏱️ Drain deadline reached, interrupting remaining work")
+            waiters[0].cancel()
+        
+        await self.cancel_queued_jobs()
+    
+    async def cancel_queued_jobs(self):
+        """Reject jobs that never started so their users know to retry"""
+        jobs = []
+        while not self.react_queue.empty():
+            job = self.react_queue.get_nowait()
+            self.release_job(job)
+            self.react_queue.task_done()
+            jobs.append(job)
+        
+        await asyncio.gather(*(
+            self.edit_job_status(job, f"⚠️ Job #{job.job_id} was cancelled because the bot is restarting. Please send /react again.")
+            for job in jobs
+        ))
+    
+    def flush_state(self):
+        """Write everything still held in memory before exit"""
+        self.flush_counters()
+    
+    def flush_counters(self):
+        pending = counters.take_pending()
+        if pending:
+            try:
+                db.add_counters(pending)
+            except Exception as e:
+                counters.requeue(pending)
+                logger.error(f"Error flushing counters: {e}")
+        
+        pending = channel_stats.take_pending()
+        if pending:
+            try:
+                db.add_channel_stats(pending)
+            except Exception as e:
+                channel_stats.requeue(pending)
+                logger.error(f"Error flushing channel stats: {e}")
+    
+    async def counter_flush_loop(self):
+        """Flush counter deltas every few seconds"""
+        while True:
+            await asyncio.sleep(COUNTERS_FLUSH_SECONDS)
+            self.flush_counters()
+    
+    async def trace_export_loop(self):
+        """Push finished traces to TRACE_OTLP_ENDPOINT as OTLP/JSON"""
+        from aiohttp import ClientSession, ClientTimeout
+        
+        async with ClientSession(timeout=ClientTimeout(total=10)) as session:
+            while not await self.wait_for_stop(TRACE_EXPORT_SECONDS):
+                traces = self.tracer.take_unexported()
+                if not traces:
+                    continue
+                try:
+                    async with session.post(TRACE_OTLP_ENDPOINT, json=PostTracer.to_otlp(traces)) as response:
+                        if response.status >= 300:
+                            raise RuntimeError(f"collector returned HTTP {response.status}")
+                except Exception as e:
+                    self.tracer.export_failures += 1
+                    logger.warning(f"Could not export {len(traces)} traces: {e}")
+    
+    async def post_shutdown(self, application: Application):
+        """Stop background tasks, flush state and release resources"""
+        # Cancelling checkpoints any post still being processed
+        await self.supervisor.stop()
+        self.loop_monitor.stop_block_detector()
+        if self.web_runner:
+            await self.web_runner.cleanup()
+        self.flush_state()
+        db.close()
+        logger.info("👋 Shutdown complete")
+    
+    async def wait_for_stop(self, timeout):
+        """Sleep for up to timeout seconds; returns True early if shutdown has started"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
     
     def setup_handlers(self):
         # Command handlers
@@ -578,66 +2829,159 @@ class ReactionBot:
         self.application.add_handler(CommandHandler("admin_addpremium", self.admin_add_premium))
         self.application.add_handler(CommandHandler("admin_channels", self.admin_channels))
         self.application.add_handler(CommandHandler("admin_stats", self.admin_stats))
+        self.application.add_handler(CommandHandler("admin_deadletters", self.admin_dead_letters))
+        self.application.add_handler(CommandHandler("admin_export", self.admin_export))
         self.application.add_handler(CommandHandler("health", self.health_check))
         self.application.add_handler(CommandHandler("react", self.react_command))
         self.application.add_handler(CommandHandler("verify", self.verify_command))
         
+        # Join/leave events in the required channels keep channel_members current
+        if MEMBERSHIP_MODE == "events":
+            self.application.add_handler(ChatMemberHandler(self.handle_chat_member, ChatMemberHandler.CHAT_MEMBER))
+        
+        # The bot's own membership changes: added to or removed from a channel
+        self.application.add_handler(ChatMemberHandler(self.handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
+        
         # Callback query handler for inline keyboards
         self.application.add_handler(CallbackQueryHandler(self.button_handler))
         
-        # Message handler for all messages (to detect channel posts)
-        self.application.add_handler(MessageHandler(filters.ALL, self.handle_all_messages))
-        
-        # My Chat Member handler for when bot is added to channels
-        self.application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, self.handle_new_chat_members))
+        # New channel posts only; edits and other chats never reach the ingest path
+        self.application.add_handler(MessageHandler(filters.UpdateType.CHANNEL_POST, self.handle_channel_post))
         
         # Error handler
         self.application.add_error_handler(self.error_handler)
     
     async def health_check_loop(self):
-        """Periodic health check loop"""
+        """Periodic health check loop that publishes the cached health snapshot"""
         while True:
             try:
-                health_monitor.update_health_check()
-                # Test database connection
-                db.get_channels()
-                logger.info("✅ Health check passed")
-                await asyncio.sleep(60)  # Check every minute
+                snapshot = await self.refresh_health_snapshot()
+                if snapshot['status'] == "healthy":
+                    logger.info("✅ Health check passed", extra={"sample_key": "health_ok"})
+                else:
+                    logger.warning(f"⚠️ Health check degraded: database={snapshot['database']['ok']} bot_api={snapshot['bot_api']['ok']}")
+                await asyncio.sleep(HEALTH_CHECK_INTERVAL)
             except Exception as e:
                 logger.error(f"❌ Health check failed: {e}")
-                await asyncio.sleep(30)  # Retry sooner if failed
+                await asyncio.sleep(HEALTH_CHECK_INTERVAL / 2)  # Retry sooner if failed
+    
+    async def refresh_health_snapshot(self):
+        """Probe the database and Bot API once and publish the results for all health endpoints"""
+        health_monitor.update_health_check()
+        
+        database = {'ok': False, 'latency_ms': None}
+        started = time.monotonic()
+        try:
+            # The backlog scan can take a while; keep it off the event loop
+            channels, backlog, retry_stats, counter_totals = await asyncio.to_thread(self.read_health_stats)
+            if counter_totals is not None:
+                counters.reload(counter_totals)
+            database = {'ok': True, 'latency_ms': round((time.monotonic() - started) * 1000, 1)}
+        except Exception as e:
+            channels, backlog, retry_stats = {'total': 0, 'auto_react': 0}, {'pending': 0}, {}
+            database['error'] = str(e)
+        
+        bot_api = {'ok': False, 'latency_ms': None}
+        started = time.monotonic()
+        try:
+            await self.bot.get_me(**self.http.timeouts("membership"))
+            bot_api = {'ok': True, 'latency_ms': round((time.monotonic() - started) * 1000, 1)}
+        except Exception as e:
+            bot_api['error'] = str(e)
+        
+        stats = health_monitor.get_stats()
+        snapshot = {
+            "status": "healthy" if database['ok'] and bot_api['ok'] else "unhealthy",
+            "timestamp": clock.now().isoformat(),
+            "uptime": stats['uptime'],
+            "total_reactions": stats['total_reactions_sent'],
+            "total_posts": stats['total_posts_processed'],
+            "duplicates_dropped": self.recent_posts.duplicates_dropped,
+            "channels": channels,
+            "pending_posts": backlog['pending'],
+            "backlog": dict(backlog, drain_order=DRAIN_ORDER, drain_deferred=self.drain_deferred,
+                            skipped_stale=counters.total("posts_skipped_stale")),
+            "retries": retry_stats,
+            "database": database,
+            "bot_api": bot_api,
+            "event_loop": self.loop_monitor.get_stats(),
+            "reaction_catalog": self.reaction_catalog.get_stats(),
+            "circuit_breakers": self.breakers.get_stats(),
+            "traces": self.tracer.get_stats(),
+            "logging": log_sampler.get_stats(),
+            "background_tasks": self.supervisor.get_stats()
+        }
+        health_monitor.publish(snapshot)
+        return snapshot
+    
+    def read_health_stats(self):
+        # Reactions and posts are counted by the delivery processes in split mode
+        counter_totals = db.get_counter_totals() if self.role == "ingest" else None
+        return db.count_channels(), db.get_backlog_stats(self.stale_cutoff()), db.get_retry_stats(), counter_totals
+    
+    def get_load(self):
+        """Current load figures for autoscaling decisions; cheap enough to compute per request"""
+        snapshot = health_monitor.snapshot or {}
+        pool = self.http.get_stats()['api']
+        return {
+            "react_queue_depth": self.react_queue.qsize(),
+            "react_queue_capacity": REACT_QUEUE_SIZE,
+            "react_workers_busy": self.busy_job_workers,
+            "react_workers_total": REACT_JOB_WORKERS,
+            "worker_saturation": round(self.busy_job_workers / REACT_JOB_WORKERS, 2) if REACT_JOB_WORKERS else 0.0,
+            "pending_posts": snapshot.get('pending_posts', 0),
+            "backlog_oldest_age_seconds": snapshot.get('backlog', {}).get('oldest_age_seconds', 0),
+            "http_in_flight": pool['in_flight'],
+            "http_pool_size": pool['pool_size'],
+            "event_loop_lag_ms": round(health_monitor.loop_lag * 1000, 1),
+            "event_loop_max_lag_ms": round(health_monitor.max_loop_lag * 1000, 1),
+            "event_loop_lag": self.loop_monitor.percentiles(),
+            "updates_in_flight": self.update_processor.in_flight,
+            "updates_waiting": self.update_processor.waiting,
+            "update_concurrency": self.update_processor.concurrency,
+            "updates_dropped": self.update_processor.dropped,
+            "log_queue_depth": log_listener.queue.qsize(),
+            "log_lines_suppressed": log_sampler.suppressed_total
+        }
     
     async def keep_alive_loop(self):
         """Keep-alive loop to prevent Render from sleeping"""
         while True:
             try:
                 # Simple operation to keep the bot active
-                channels_count = len(db.get_channels())
-                logger.info(f"🤖 Bot is alive. Managing {channels_count} channels")
+                channels_count = (health_monitor.snapshot or {}).get('channels', {}).get('total', 0)
+                logger.info(f"🤖 Bot is alive. Managing {channels_count} channels", extra={"sample_key": "keep_alive"})
                 await asyncio.sleep(300)  # Ping every 5 minutes
             except Exception as e:
                 logger.error(f"Keep-alive error: {e}")
                 await asyncio.sleep(60)
     
     async def health_check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Health check command for monitoring"""
+        """Health check command for monitoring (served from the cached snapshot)"""
         try:
-            # Test database
-            db.get_channels()
+            snapshot = health_monitor.snapshot
+            if not snapshot:
+                await update.message.reply_text("⏳ Health check has not run yet, please try again shortly.")
+                return
             
-            stats = health_monitor.get_stats()
+            pool = self.http.get_stats()['api']
+            healthy = snapshot['status'] == "healthy"
             health_text = f"""
 🏥 **Bot Health Status**
 
-**Status:** ✅ Healthy
-**Uptime:** {stats['uptime']}
-**Total Reactions Sent:** {stats['total_reactions_sent']:,}
-**Total Posts Processed:** {stats['total_posts_processed']}
-**Last Health Check:** {stats['last_health_check']}
+**Status:** {'✅ Healthy' if healthy else '⚠️ Unhealthy'}
+**Uptime:** {snapshot['uptime']}
+**Total Reactions Sent:** {snapshot['total_reactions']:,}
+**Total Posts Processed:** {snapshot['total_posts']}
+**Duplicate Posts Dropped:** {snapshot['duplicates_dropped']:,}
+**Last Health Check:** {snapshot['timestamp']}
 
-**Database:** ✅ Connected
-**Bot:** ✅ Running
-**Channels Managed:** {len(db.get_channels())}
+**Database:** {'✅ Connected' if snapshot['database']['ok'] else '❌ Unavailable'} ({snapshot['database']['latency_ms']} ms)
+**Bot API:** {'✅ Reachable' if snapshot['bot_api']['ok'] else '❌ Unreachable'} ({snapshot['bot_api']['latency_ms']} ms)
+**Channels Managed:** {snapshot['channels']['total']}
+**Pending Posts:** {snapshot['pending_posts']}
+**HTTP Pool:** {pool['in_flight']}/{pool['pool_size']} in use, avg wait {pool['avg_wait_ms']} ms
+**Event Loop Lag:** {health_monitor.loop_lag * 1000:.0f} ms (p99 {self.loop_monitor.percentiles()['p99_ms']:.0f} ms)
             """
             
             await update.message.reply_text(health_text, parse_mode='Markdown')
@@ -649,8 +2993,12 @@ class ReactionBot:
         """Check if user has joined all required channels"""
         try:
             for channel in REQUIRED_CHANNELS:
-                chat_member = await self.bot.get_chat_member(f"@{channel['username']}", user_id)
-                if chat_member.status in ['left', 'kicked']:
+                chat_member = await self.bot.get_chat_member(
+                    f"@{channel['username']}", user_id, **self.http.timeouts("membership")
+                )
+                if MEMBERSHIP_MODE == "events":
+                    db.set_channel_member(channel['username'], user_id, chat_member.status)
+                if chat_member.status in LEFT_STATUSES:
                     return False
             return True
         except Exception as e:
@@ -686,6 +3034,12 @@ To use this bot, you must join our official channels first!
     
     async def require_channel_join(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Check if user needs to join channels and show requirement message if needed"""
+        if MEMBERSHIP_MODE == "events":
+            if await self.is_member_of_required_channels(user_id):
+                return True
+            await self.send_channel_requirement_message(update, context)
+            return False
+        
         user = db.get_user(user_id)
         
         # If user hasn't verified or needs re-verification
@@ -694,8 +3048,8 @@ To use this bot, you must join our official channels first!
             return False
         
         # Re-verify periodically (once per day)
-        joined_at = datetime.fromisoformat(user['joined_at']) if user['joined_at'] else datetime.min
-        if datetime.now() - joined_at > timedelta(days=1):
+        joined_at = _to_datetime(user['joined_at']) or datetime.min
+        if clock.now() - joined_at > timedelta(days=1):
             is_joined = await self.check_user_joined_channels(user_id)
             if not is_joined:
                 await self.send_channel_requirement_message(update, context)
@@ -705,29 +3059,148 @@ To use this bot, you must join our official channels first!
         
         return True
     
+    async def premium_sweeper(self):
+        """Expire premium subscriptions in batches, off the request path"""
+        while True:
+            expired = 0
+            while True:
+                batch = db.expire_premium_batch()
+                expired += len(batch)
+                if len(batch) < PREMIUM_SWEEP_BATCH:
+                    break
+                await asyncio.sleep(0)  # Let other work run between batches
+            if expired:
+                logger.info(f"⌛ Expired premium for {expired} users")
+            await asyncio.sleep(PREMIUM_SWEEP_SECONDS)
+    
+    async def is_member_of_required_channels(self, user_id):
+        """Answer from the local membership table; only unknown users cost API calls"""
+        statuses = db.get_member_statuses(user_id)
+        known = [statuses.get(channel['username'].lower()) for channel in REQUIRED_CHANNELS]
+        if any(status in LEFT_STATUSES for status in known):
+            return False
+        if all(known):
+            return True
+        # First time we see this user: verify once and record the result
+        return await self.check_user_joined_channels(user_id)
+    
+    async def handle_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Track joins and leaves in the required channels"""
+        try:
+            member_update = update.chat_member
+            username = (member_update.chat.username or "").lower()
+            if username not in self.required_usernames:
+                return
+            member = member_update.new_chat_member
+            db.set_channel_member(username, member.user.id, member.status)
+        except Exception as e:
+            logger.error(f"Error in handle_chat_member: {e}")
+    
+    async def membership_reconciler(self):
+        """Slowly re-verify the stalest membership rows to correct missed events"""
+        while True:
+            await asyncio.sleep(MEMBERSHIP_RECONCILE_SECONDS)
+            cutoff = clock.now() - timedelta(days=MEMBERSHIP_STALE_DAYS)
+            for user_id in db.get_stale_members(cutoff, MEMBERSHIP_RECONCILE_BATCH):
+                await self.check_user_joined_channels(user_id)
+                await asyncio.sleep(1)
+    
     async def periodic_cleanup(self):
         """Periodically clean up old records"""
         while True:
             await asyncio.sleep(300)  # Run every 5 minutes
             db.cleanup_old_records()
     
+    def stale_cutoff(self):
+        """post_time before which a post is stale, or None without an age limit"""
+        return clock.now() - timedelta(minutes=MAX_POST_AGE_MINUTES) if MAX_POST_AGE_MINUTES else None
+    
+    async def iter_pending_posts(self):
+        """Walk the due backlog in DRAIN_ORDER, one bounded batch at a time"""
+        pass_started = clock.monotonic()
+        self.drain_restart = False
+        stale_cutoff = self.stale_cutoff()
+        if stale_cutoff and STALE_POST_ACTION == "skip":
+            skipped = db.skip_stale_posts(stale_cutoff, shard=self.shard)
+            if skipped:
+                counters.incr("posts_skipped_stale", skipped)
+                logger.info(f"⏭️ Skipped {skipped} posts older than {MAX_POST_AGE_MINUTES:.0f} minutes")
+        
+        # Stale posts (kept with "defer") only come after every fresh one, in any order
+        if stale_cutoff and STALE_POST_ACTION == "defer":
+            segments = [{'newer_than': stale_cutoff}, {'older_than': stale_cutoff}]
+        else:
+            segments = [{}]
+        newest_first = DRAIN_ORDER == "newest"
+        
+        for segment in segments:
+            async for post in self.walk_pending_posts(segment, newest_first, pass_started):
+                if not self.admit_for_drain(post):
+                    # Catch-up budget spent: the rest of this pass only takes live posts
+                    live = {'newer_than': clock.now() - timedelta(seconds=DRAIN_LIVE_SECONDS)}
+                    async for live_post in self.walk_pending_posts(live, newest_first, pass_started):
+                        yield live_post
+                    return
+                yield post
+            if self.drain_restart:
+                return
+    
+    async def walk_pending_posts(self, segment, newest_first, pass_started):
+        """Pending posts matching segment, in keyset order, one bounded batch at a time"""
+        after = None
+        while not self.stop_event.is_set():
+            batch = db.get_pending_posts(after, newest_first=newest_first, shard=self.shard, **segment)
+            for post in batch:
+                # Newest-first starts over once new posts arrive so they go ahead of the backlog
+                if newest_first and self.last_ingest_at > pass_started:
+                    self.drain_restart = True
+                    return
+                # Posts of chats behind an open breaker stay pending without using the catch-up budget
+                if self.breakers.cooling_down(post.channel_id):
+                    self.breakers.skipped += 1
+                    continue
+                yield post
+            if len(batch) < PENDING_POSTS_BATCH:
+                return
+            after = batch[-1].position
+    
+    def admit_for_drain(self, post):
+        """Live posts always go through; older ones share the DRAIN_BACKLOG_PER_MINUTE budget.
+        
+        drain_deferred counts the passes cut short because the budget ran out.
+        """
+        if not self.drain_limiter or post.age() <= DRAIN_LIVE_SECONDS:
+            return True
+        if self.drain_limiter.try_acquire():
+            return True
+        self.drain_deferred += 1
+        return False
+    
     async def process_channel_posts(self):
         """Background task to process pending channel posts"""
-        while True:
+        while not self.stop_event.is_set():
             try:
-                pending_posts = db.get_pending_posts()
-                for post in pending_posts:
+                async for post in self.iter_pending_posts():
+                    if self.stop_event.is_set():
+                        break
                     await self.process_channel_post(post)
-                await asyncio.sleep(2)  # Check every 2 seconds
+                if not self.drain_restart:
+                    await self.wait_for_stop(2)  # Check every 2 seconds
             except Exception as e:
                 logger.error(f"Error in process_channel_posts: {e}")
-                await asyncio.sleep(10)
+                await self.wait_for_stop(10)
     
     async def process_channel_post(self, post):
         """Process a single channel post with permanent reactions"""
         try:
-            channel_id = post['channel_id']
-            message_id = post['message_id']
+            channel_id = post.channel_id
+            message_id = post.message_id
+            trace = self.tracer.get(post.id)
+            if trace is None and self.role == "delivery":
+                trace = self.tracer.adopt(post)
+            if trace:
+                trace.attempts += 1
+                trace.mark("dequeued")
             
             # Use first admin user ID for channel reactions
             admin_id = ADMIN_IDS[0] if ADMIN_IDS else None
@@ -736,17 +3209,58 @@ To use this bot, you must join our official channels first!
             
             # Determine how many reactions to send (use premium limit for channels)
             num_reactions = min(50, PREMIUM_REACTIONS_PER_POST)  # Send substantial permanent reactions
+            # Resume from the checkpoint left by an interrupted run
+            already_sent = post.reactions_sent
+            remaining = max(0, num_reactions - already_sent)
+            if remaining == 0:
+                db.mark_post_processed(post.id, already_sent)
+                self.tracer.finish(post.id, "processed")
+                return
+            
+            # Chats behind an open breaker keep their posts pending without any API calls
+            if not self.breakers.allow(channel_id):
+                return
             
-            if db.can_send_reactions(admin_id, message_id, channel_id, num_reactions):
-                success_count, reactions_sent = await self.send_permanent_reactions(channel_id, message_id, num_reactions)
+            if db.can_send_reactions(admin_id, message_id, channel_id, remaining):
+                progress = {'done': 0}
+                
+                async def track_progress(done, total):
+                    progress['done'] = done
+                
+                try:
+                    success_count, reactions_sent, last_error = await self.send_permanent_reactions(
+                        channel_id, message_id, remaining, progress_callback=track_progress, trace=trace
+                    )
+                except asyncio.CancelledError:
+                    # Shutdown interrupted this post: keep what was delivered
+                    if progress['done']:
+                        db.checkpoint_post(post.id, already_sent + progress['done'])
+                    raise
                 
                 if success_count > 0:
+                    self.breakers.record_success(channel_id)
+                    channel_stats.incr(channel_id, "posts_reacted")
+                    channel_stats.incr(channel_id, "reactions", success_count)
+                    post_time = _to_datetime(post.post_time)
+                    if post_time:
+                        channel_stats.observe_latency(channel_id, (clock.now() - post_time).total_seconds())
                     # Log as permanent reactions
                     permanent_id = db.log_permanent_reaction(admin_id, message_id, channel_id, reactions_sent)
-                    db.mark_post_processed(post['id'], success_count, permanent_id)
-                    health_monitor.increment_reactions(success_count)
-                    health_monitor.increment_posts()
-                    logger.info(f"Sent {success_count} PERMANENT reactions to post {message_id} in channel {channel_id}")
+                    db.mark_post_processed(post.id, already_sent + success_count, permanent_id)
+                    if trace:
+                        trace.reactions = already_sent + success_count
+                        self.tracer.finish(post.id, "processed")
+                    health_monitor.increment_reactions(success_count, channel_id)
+                    health_monitor.increment_posts(channel_id)
+                    logger.info(f"Sent {success_count} PERMANENT reactions to post {message_id} in channel {channel_id}",
+                                extra={"sample_key": "post_reacted"})
+                elif self.breakers.record_failure(channel_id, last_error):
+                    # The whole chat is failing: the post waits for the breaker instead of using up retries
+                    channel_stats.incr(channel_id, "failures")
+                    self.deactivate_if_broken(channel_id)
+                else:
+                    channel_stats.incr(channel_id, "failures")
+                    self.schedule_post_retry(post, last_error)
                 
                 # Small delay between posts
                 await asyncio.sleep(1)
@@ -754,27 +3268,68 @@ To use this bot, you must join our official channels first!
         except Exception as e:
             logger.error(f"Error processing channel post: {e}")
     
-    async def handle_new_chat_members(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle when bot is added to channels/groups"""
+    def deactivate_if_broken(self, channel_id):
+        """Deactivate a channel whose breaker has found it broken for BREAKER_DEACTIVATE_HOURS"""
+        if self.breakers.broken_for(channel_id) < BREAKER_DEACTIVATE_HOURS * 3600:
+            return
+        db.deactivate_channel(channel_id)
+        self.breakers.reset(channel_id)
+        self.reaction_catalog.invalidate(channel_id)
+        logger.warning(f"🚫 Channel {channel_id} deactivated after failing for {BREAKER_DEACTIVATE_HOURS:.0f}h")
+    
+    def schedule_post_retry(self, post, error):
+        """Back off a post whose delivery failed completely"""
+        error_class = classify_error(error) if error else RETRYABLE
+        error_text = str(error) if error else "no reactions delivered"
+        retry_after = getattr(error, 'retry_after', None)
+        if isinstance(retry_after, timedelta):
+            retry_after = retry_after.total_seconds()
+        
+        try:
+            delay = db.record_delivery_failure(post, error_class, error_text, retry_after)
+        except Exception as e:
+            # Nothing was recorded: the post stays pending and is picked up again
+            logger.error(f"Error recording delivery failure for post {post.id}: {e}")
+            return
+        if delay is None:
+            self.tracer.finish(post.id, "dead_letter")
+            logger.warning(f"☠️ Post {post.message_id} in channel {post.channel_id} dead-lettered ({error_class}): {error_text}")
+        else:
+            logger.info(f"🔁 Post {post.message_id} in channel {post.channel_id} will be retried in {delay:.0f}s ({error_class})",
+                        extra={"sample_key": "post_retry"})
+    
+    async def handle_my_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Register channels the bot is added to and deactivate those it is removed from"""
         try:
-            if update.message.new_chat_members:
-                for user in update.message.new_chat_members:
-                    if user.id == context.bot.id:
-                        chat = update.effective_chat
-                        if chat.type in [ChatType.CHANNEL, ChatType.GROUP, ChatType.SUPERGROUP]:
-                            # Bot was added to a channel/group
-                            added_by = update.effective_user.id
-                            db.add_channel(chat.id, chat.username, chat.title, added_by)
-                            
-                            # Send welcome message with inline keyboard
-                            keyboard = [
-                                [InlineKeyboardButton("✅ Enable Auto-Reactions", callback_data=f"enable_auto_{chat.id}")],
-                                [InlineKeyboardButton("❌ Disable Auto-Reactions", callback_data=f"disable_auto_{chat.id}")],
-                                [InlineKeyboardButton("📊 Channel Stats", callback_data=f"channel_stats_{chat.id}")]
-                            ]
-                            reply_markup = InlineKeyboardMarkup(keyboard)
-                            
-                            welcome_text = f"""
+            member_update = update.my_chat_member
+            chat = member_update.chat
+            if chat.type not in [ChatType.CHANNEL, ChatType.GROUP, ChatType.SUPERGROUP]:
+                return
+            
+            old_status = member_update.old_chat_member.status
+            new_status = member_update.new_chat_member.status
+            if new_status in LEFT_STATUSES:
+                db.deactivate_channel(chat.id)
+                logger.info(f"👋 Removed from {chat.title} ({chat.id}), channel deactivated")
+                return
+            if old_status not in LEFT_STATUSES:
+                # Promotions and permission changes while already a member
+                return
+            
+            # Bot was added to a channel/group
+            added_by = member_update.from_user.id
+            db.add_channel(chat.id, chat.username, chat.title, added_by)
+            logger.info(f"➕ Added to {chat.title} ({chat.id}) by {added_by}")
+            
+            # Send welcome message with inline keyboard
+            keyboard = [
+                [InlineKeyboardButton("✅ Enable Auto-Reactions", callback_data=f"enable_auto_{chat.id}")],
+                [InlineKeyboardButton("❌ Disable Auto-Reactions", callback_data=f"disable_auto_{chat.id}")],
+                [InlineKeyboardButton("📊 Channel Stats", callback_data=f"channel_stats_{chat.id}")]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            welcome_text = f"""
 🤖 **Reaction Bot Added to {chat.title}**
 
 I will automatically send **PERMANENT** reactions to all new posts in this channel!
@@ -786,26 +3341,41 @@ I will automatically send **PERMANENT** reactions to all new posts in this chann
 • Time window: 5 minutes
 
 Use the buttons below to configure auto-reactions.
-                            """
-                            
-                            await update.message.reply_text(welcome_text, reply_markup=reply_markup)
+            """
+            
+            # Channels can't hold the settings keyboard, so it goes to whoever added the bot
+            try:
+                await context.bot.send_message(chat_id=added_by, text=welcome_text, reply_markup=reply_markup)
+            except Forbidden:
+                logger.warning(f"Could not send channel welcome to {added_by}: they have not started the bot")
         except Exception as e:
-            logger.error(f"Error in handle_new_chat_members: {e}")
+            logger.error(f"Error in handle_my_chat_member: {e}")
     
-    async def handle_all_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle all messages to detect channel posts"""
+    async def handle_channel_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Queue a new channel post for reactions"""
         try:
             chat = update.effective_chat
-            message = update.effective_message
+            message = update.channel_post
             
-            # Only process channel messages
-            if chat.type == ChatType.CHANNEL and message:
-                # Log the channel post for processing
-                db.log_channel_post(chat.id, message.message_id)
-                logger.info(f"New post detected in channel {chat.title}: {message.message_id}")
-                
+            # Drop redelivered updates before any SQL or API work
+            if self.recent_posts.seen(chat.id, message.message_id):
+                return
+            trace = self.tracer.start(chat.id, message.message_id)
+            
+            # Log the channel post for processing
+            post_id = db.log_channel_post(chat.id, message.message_id)
+            if post_id is None:
+                # Not stored; let a redelivery try again
+                self.recent_posts.discard(chat.id, message.message_id)
+                return
+            if trace:
+                self.tracer.track(post_id, trace)
+            channel_stats.incr(chat.id, "posts_seen")
+            self.last_ingest_at = clock.monotonic()
+            logger.info(f"New post detected in channel {chat.title}: {message.message_id}",
+                        extra={"sample_key": "post_detected"})
         except Exception as e:
-            logger.error(f"Error in handle_all_messages: {e}")
+            logger.error(f"Error in handle_channel_post: {e}")
     
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle inline keyboard button presses"""
@@ -839,6 +3409,12 @@ Use the buttons below to configure auto-reactions.
             else:
                 await query.edit_message_text("❌ Admin access required.")
         
+        elif data == "admin_channels_list" or data.startswith(('chpg:', 'chtg:', 'chsr:', 'toggle_channel_')):
+            if user_id in ADMIN_IDS:
+                await self.admin_channels_callback(update, context, data)
+            else:
+                await query.edit_message_text("❌ Admin access required.")
+        
         elif data.startswith('enable_auto_'):
             channel_id = int(data.split('_')[-1])
             db.toggle_channel_auto_react(channel_id)
@@ -851,22 +3427,38 @@ Use the buttons below to configure auto-reactions.
             
         elif data.startswith('channel_stats_'):
             channel_id = int(data.split('_')[-1])
-            channels = db.get_channels()
-            channel = next((c for c in channels if c['channel_id'] == channel_id), None)
+            channel = db.get_channel(channel_id)
             
             if channel:
+                now = clock.now()
+                day = self.format_channel_activity(db.get_channel_stats(channel_id, now - timedelta(hours=24)))
+                week = self.format_channel_activity(db.get_channel_stats(channel_id, now - timedelta(days=7)))
                 stats_text = f"""
 📊 **Channel Stats - {channel['channel_title']}**
 
 • Auto-reactions: {'✅ Enabled' if channel['auto_react'] else '❌ Disabled'}
 • Reaction limit: {PREMIUM_REACTIONS_PER_POST:,} per post
 • Reactions: 🔥 Permanent
-• Time window: 5 minutes
 
-The bot will automatically react to all new posts with permanent reactions.
+**Last 24 hours:**
+{day}
+
+**Last 7 days:**
+{week}
                 """
                 await query.edit_message_text(stats_text)
     
+    def format_channel_activity(self, totals):
+        """Bullet lines for one period of a channel's rollups"""
+        median = ChannelStats.median_latency(totals)
+        return (
+            f"• Posts seen: {totals.get('posts_seen', 0):,}\n"
+            f"• Posts reacted: {totals.get('posts_reacted', 0):,}\n"
+            f"• Reactions applied: {totals.get('reactions', 0):,}\n"
+            f"• Failed attempts: {totals.get('failures', 0):,}\n"
+            f"• Median time to react: {f'{median:.1f}s' if median is not None else 'n/a'}"
+        )
+    
     async def admin_panel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Admin panel with management options"""
         keyboard = [
@@ -885,13 +3477,14 @@ The bot will automatically react to all new posts with permanent reactions.
 **Admin IDs:** {', '.join(map(str, ADMIN_IDS))}
 **Bot Status:** ✅ Running
 **Uptime:** {stats['uptime']}
-**Total Channels:** {len(db.get_channels())}
+**Total Channels:** {(health_monitor.snapshot or {}).get('channels', {}).get('total', 0)}
 **Total Reactions:** {stats['total_reactions_sent']:,}
 
 **Available Commands:**
 • /admin_stats - Detailed bot statistics
 • /admin_channels - Manage channels
 • /admin_addpremium - Add premium to users
+• /admin_deadletters - Posts that failed permanently
 • /health - Health check
 
 Use the buttons below for quick access.
@@ -910,10 +3503,28 @@ Use the buttons below for quick access.
             await update.message.reply_text("❌ This command is for admins only.")
             return
         
-        channels = db.get_channels()
-        total_channels = len(channels)
-        active_auto_react = len([c for c in channels if c['auto_react']])
+        channel_counts = db.count_channels()
+        total_channels = channel_counts['total']
+        active_auto_react = channel_counts['auto_react']
         stats = health_monitor.get_stats()
+        retry_stats = db.get_retry_stats()
+        
+        # Read the precomputed daily aggregates, including deltas not yet flushed
+        self.flush_counters()
+        today = clock.now().date()
+        all_time = db.get_counter_summary()
+        last_7_days = db.get_counter_summary((today - timedelta(days=6)).isoformat())
+        today_counts = db.get_counter_summary(today.isoformat())
+        
+        def metric_total(summary, metric):
+            return sum(value for (name, _), value in summary.items() if name == metric)
+        
+        tier_lines = ""
+        for tier in ("channel", "admin", "premium", "regular"):
+            reactions = all_time.get(("reactions_sent", tier), 0)
+            if reactions:
+                tier_lines += f"• {tier.title()}: {reactions:,} reactions\n"
+        tier_lines = tier_lines or "• None yet\n"
         
         stats_text = f"""
 📊 **Admin Statistics**
@@ -925,10 +3536,17 @@ Use the buttons below for quick access.
 • Uptime: {stats['uptime']}
 
 **Performance Statistics:**
-• Total Reactions Sent: {stats['total_reactions_sent']:,}
-• Total Posts Processed: {stats['total_posts_processed']}
+• Total Reactions Sent: {metric_total(all_time, 'reactions_sent'):,}
+• Total Posts Processed: {metric_total(all_time, 'posts_processed'):,}
+• Reactions Today: {metric_total(today_counts, 'reactions_sent'):,}
+• Reactions Last 7 Days: {metric_total(last_7_days, 'reactions_sent'):,}
+• /react Jobs Last 7 Days: {metric_total(last_7_days, 'react_jobs'):,}
 • Last Health Check: {stats['last_health_check']}
+• Posts Awaiting Retry: {retry_stats['retrying']}
+• Dead-lettered Posts: {retry_stats['dead_letters']}
 
+**Reactions by Tier:**
+{tier_lines}
 **Channel Statistics:**
 • Total Channels: {total_channels}
 • Auto-reactions Enabled: {active_auto_react}
@@ -946,6 +3564,126 @@ Use the buttons below for quick access.
         
         await update.message.reply_text(stats_text, parse_mode='Markdown')
     
+    async def admin_dead_letters(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show channel posts whose deliveries were given up on"""
+        user_id = update.effective_user.id
+        
+        if user_id not in ADMIN_IDS:
+            await update.message.reply_text("❌ This command is for admins only.")
+            return
+        
+        try:
+            limit = min(int(context.args[0]), 50) if context.args else 10
+        except ValueError:
+            await update.message.reply_text("Usage: /admin_deadletters [limit]")
+            return
+        
+        dead_letters = db.get_dead_letters(limit)
+        if not dead_letters:
+            await update.message.reply_text("✅ No dead-lettered posts.")
+            return
+        
+        text = f"☠️ Dead-lettered posts (latest {len(dead_letters)}):\n\n"
+        for letter in dead_letters:
+            text += f"• Channel {letter['channel_id']}, message {letter['message_id']}\n"
+            text += f"   {letter['error_class']} after {letter['attempts']} attempts at {letter['failed_at']}\n"
+            text += f"   {(letter['last_error'] or '')[:200]}\n\n"
+        
+        await update.message.reply_text(text)
+    
+    async def admin_export(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Export a history table as a gzipped JSONL/CSV document"""
+        user_id = update.effective_user.id
+        
+        if user_id not in ADMIN_IDS:
+            await update.message.reply_text("❌ This command is for admins only.")
+            return
+        
+        usage = f"Usage: /admin_export <{'|'.join(EXPORT_TABLES)}> [jsonl|csv] [after_id]"
+        if not context.args or context.args[0] not in EXPORT_TABLES:
+            await update.message.reply_text(usage)
+            return
+        table = context.args[0]
+        fmt = context.args[1] if len(context.args) > 1 else "jsonl"
+        try:
+            after_id = int(context.args[2]) if len(context.args) > 2 else 0
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+        if fmt not in ("jsonl", "csv"):
+            await update.message.reply_text(usage)
+            return
+        if self.export_lock.locked():
+            await update.message.reply_text("⏳ Another export is running. Please try again when it finishes.")
+            return
+        
+        status = await update.message.reply_text(f"📦 Exporting {table} after id {after_id}...")
+        with tempfile.TemporaryFile() as export_file:
+            async def write(data):
+                export_file.write(data)
+            
+            rows, last_id = await self.stream_export(table, fmt, after_id, write, max_rows=EXPORT_COMMAND_MAX_ROWS)
+            export_file.seek(0)
+            
+            caption = f"📦 {table}: {rows:,} rows, ids {after_id + 1 if rows else after_id}–{last_id}"
+            if rows >= EXPORT_COMMAND_MAX_ROWS:
+                caption += f"\nMore rows remain: /admin_export {table} {fmt} {last_id}"
+            await update.message.reply_document(
+                document=export_file,
+                filename=f"{table}_after_{after_id}.{fmt}.gz",
+                caption=caption
+            )
+        await status.delete()
+    
+    async def stream_export(self, table, fmt, after_id, write, max_rows=None):
+        """Stream rows with id > after_id to write() as gzip-compressed JSONL or CSV.
+        
+        Rows are fetched and compressed one chunk at a time, pausing between
+        chunks so the bot stays responsive. Returns (rows_written, last_id);
+        last_id is the checkpoint to resume from.
+        """
+        columns = EXPORT_TABLES[table]
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        rows_written, last_id = 0, after_id
+        
+        async with self.export_lock:
+            if fmt == "csv":
+                header = io.StringIO()
+                csv.writer(header).writerow(columns)
+                await write(compressor.compress(header.getvalue().encode()))
+            
+            chunks = db.iter_export_rows(table, after_id)
+            try:
+                for rows in chunks:
+                    if max_rows is not None:
+                        rows = rows[:max_rows - rows_written]
+                    
+                    buffer = io.StringIO()
+                    if fmt == "csv":
+                        csv.writer(buffer).writerows(rows)
+                    else:
+                        for row in rows:
+                            buffer.write(json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False))
+                            buffer.write("\n")
+                    
+                    data = compressor.compress(buffer.getvalue().encode())
+                    if data:
+                        await write(data)
+                    rows_written += len(rows)
+                    last_id = rows[-1][0] if rows else last_id
+                    
+                    if max_rows is not None and rows_written >= max_rows:
+                        break
+                    await asyncio.sleep(EXPORT_CHUNK_PAUSE)
+            finally:
+                # Releases the server-side cursor even if the client went away
+                chunks.close()
+            
+            await write(compressor.flush())
+        
+        logger.info(f"📦 Exported {rows_written} rows from {table} (ids {after_id}..{last_id})")
+        return rows_written, last_id
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         db.create_user(user_id)
@@ -1057,8 +3795,10 @@ Use the buttons below to get started!
             db.create_user(user_id)
             user = db.get_user(user_id)
         
-        user_type = "👑 Admin" if user_id in ADMIN_IDS else "⭐ Premium" if user['is_premium'] else "🔹 Regular"
-        limit = PREMIUM_REACTIONS_PER_POST if user_id in ADMIN_IDS or user['is_premium'] else REGULAR_REACTIONS_PER_POST
+        tier = premium_tiers.tier(user_id)
+        user_type = {"admin": "👑 Admin", "premium": "⭐ Premium"}.get(tier, "🔹 Regular")
+        limit = premium_tiers.limit(user_id)
+        premium_until = premium_tiers.expiry(user_id) if tier == "premium" else None
         
         keyboard = [
             [InlineKeyboardButton("⭐ Upgrade to Premium", callback_data="premium_info")],
@@ -1071,10 +3811,10 @@ Use the buttons below to get started!
 
 **Account Type:** {user_type}
 **Reaction Limit:** {limit:,} **PERMANENT** reactions per post (5 minutes)
-**Premium Until:** {user['premium_until'] or 'Not subscribed'}
+**Premium Until:** {premium_until.strftime('%Y-%m-%d %H:%M') if premium_until else 'Not subscribed'}
 **Channel Member:** ✅ Verified
 
-**Channels Managed:** {len(db.get_channels())}
+**Channels Managed:** {(health_monitor.snapshot or {}).get('channels', {}).get('total', 0)}
 **Reactions Type:** 🔥 Permanent (Never removed)
 
 **Usage:** I automatically react to channel posts with PERMANENT reactions or use /react command
@@ -1092,34 +3832,98 @@ Use the buttons below to get started!
             await update.message.reply_text("❌ This command is for admins only.")
             return
         
-        channels = db.get_channels()
+        # /admin_channels <text> searches titles; the search sticks while paging
+        context.user_data['channel_search'] = " ".join(context.args) if context.args else None
+        
+        channels_text, reply_markup = self.render_channels_page(context, "all")
+        await update.message.reply_text(channels_text, reply_markup=reply_markup, parse_mode='Markdown')
+    
+    def render_channels_page(self, context, filter_key, direction="next", cursor=None):
+        """Build the text and keyboard for one page of the admin channel browser"""
+        search = context.user_data.get('channel_search')
+        auto_react = CHANNEL_FILTERS.get(filter_key)
+        channels, has_more = db.get_channels_page(cursor, direction, auto_react=auto_react, search=search)
+        
+        if direction == "prev":
+            has_prev, has_next = has_more, True
+        else:
+            has_next = has_more
+            # Anything before this page?
+            has_prev = bool(channels) and bool(
+                db.get_channels_page(channels[0]['channel_id'], "prev", limit=1, auto_react=auto_react, search=search)[0]
+            )
+        
+        channels_text = "📢 **Managed Channels**"
+        channels_text += f" ({'all' if filter_key == 'all' else 'auto-react ' + filter_key})"
+        if search:
+            channels_text += f"\n🔍 Search: {escape_markdown(search)}"
+        channels_text += "\n\n"
         
         if not channels:
-            await update.message.reply_text("❌ No channels are currently managed.")
-            return
+            channels_text += "❌ No channels match."
         
-        channels_text = "📢 **Managed Channels:**\n\n"
         keyboard = []
-        
         for channel in channels:
             status = "✅" if channel['auto_react'] else "❌"
-            channels_text += f"{status} {channel['channel_title']}\n"
+            title = channel['channel_title'] or str(channel['channel_id'])
+            channels_text += f"{status} {escape_markdown(title)}\n"
             channels_text += f"   ID: {channel['channel_id']}\n"
-            channels_text += f"   Username: @{channel['channel_username']}\n"
-            channels_text += f"   Auto-react: {'Enabled' if channel['auto_react'] else 'Disabled'}\n"
-            channels_text += f"   Reactions: 🔥 Permanent\n\n"
+            if channel['channel_username']:
+                channels_text += f"   Username: @{escape_markdown(channel['channel_username'])}\n"
+            channels_text += "\n"
             
             keyboard.append([
                 InlineKeyboardButton(
-                    f"{'✅' if channel['auto_react'] else '❌'} {channel['channel_title'][:20]}",
-                    callback_data=f"toggle_channel_{channel['channel_id']}"
+                    f"{status} {title[:20]}",
+                    # Re-render from the first channel on this page after toggling
+                    callback_data=f"chtg:{channel['channel_id']}:{filter_key}:{channels[0]['channel_id']}"
                 )
             ])
         
+        navigation = []
+        if has_prev:
+            navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"chpg:{filter_key}:prev:{channels[0]['channel_id']}"))
+        if has_next and channels:
+            navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f"chpg:{filter_key}:next:{channels[-1]['channel_id']}"))
+        if navigation:
+            keyboard.append(navigation)
+        
+        keyboard.append([
+            InlineKeyboardButton(f"{'• ' if filter_key == key else ''}{label}", callback_data=f"chpg:{key}:next:")
+            for key, label in (("all", "All"), ("on", "✅ On"), ("off", "❌ Off"))
+        ])
+        if search:
+            keyboard.append([InlineKeyboardButton("✖️ Clear Search", callback_data=f"chsr:clear:{filter_key}")])
         keyboard.append([InlineKeyboardButton("🔙 Back to Admin", callback_data="admin_panel")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(channels_text, reply_markup=reply_markup, parse_mode='Markdown')
+        return channels_text, InlineKeyboardMarkup(keyboard)
+    
+    async def admin_channels_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
+        """Page navigation, filters and toggles of the admin channel browser"""
+        query = update.callback_query
+        filter_key, direction, cursor = "all", "next", None
+        
+        if data.startswith('chpg:'):
+            _, filter_key, direction, cursor_text = data.split(':', 3)
+            cursor = int(cursor_text) if cursor_text else None
+        elif data.startswith('chtg:'):
+            _, channel_id, filter_key, first_id = data.split(':', 3)
+            db.toggle_channel_auto_react(int(channel_id))
+            direction, cursor = "at", int(first_id)
+        elif data.startswith('chsr:clear:'):
+            context.user_data['channel_search'] = None
+            filter_key = data.split(':', 2)[2]
+        elif data.startswith('toggle_channel_'):
+            # Buttons from messages sent before the browser was paginated
+            db.toggle_channel_auto_react(int(data.split('_')[-1]))
+        
+        if filter_key not in CHANNEL_FILTERS:
+            filter_key = "all"
+        if direction not in ("next", "at", "prev"):
+            direction = "next"
+        
+        channels_text, reply_markup = self.render_channels_page(context, filter_key, direction, cursor)
+        await query.edit_message_text(channels_text, reply_markup=reply_markup, parse_mode='Markdown')
     
     async def admin_add_premium(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
@@ -1179,11 +3983,12 @@ Use the buttons below to get started!
             target_message_id = target_message.message_id
             target_chat_id = update.effective_chat.id
             
-            # Check if user can send reactions
-            if not db.can_send_reactions(user_id, target_message_id, target_chat_id, num_reactions):
-                user = db.get_user(user_id)
-                limit = PREMIUM_REACTIONS_PER_POST if user_id in ADMIN_IDS or user['is_premium'] else REGULAR_REACTIONS_PER_POST
-                current = db.get_post_reaction_stats(user_id, target_message_id, target_chat_id)
+            # Check if user can send reactions (including jobs still waiting in the queue)
+            quota_key = (user_id, target_chat_id, target_message_id)
+            reserved, user_jobs, queue_full = self.job_load(quota_key)
+            if not db.can_send_reactions(user_id, target_message_id, target_chat_id, num_reactions + reserved):
+                limit = premium_tiers.limit(user_id)
+                current = db.get_post_reaction_stats(user_id, target_message_id, target_chat_id) + reserved
                 
                 await update.message.reply_text(
                     f"❌ Reaction limit exceeded!\n"
@@ -1194,28 +3999,39 @@ Use the buttons below to get started!
                 )
                 return
             
-            # Send PERMANENT reactions
-            success_count, reactions_sent = await self.send_permanent_reactions(target_chat_id, target_message_id, num_reactions)
-            
-            if success_count > 0:
-                # Log as permanent reactions
-                db.log_permanent_reaction(user_id, target_message_id, target_chat_id, reactions_sent)
-                
-                keyboard = [
-                    [InlineKeyboardButton("📊 Check Stats", callback_data="user_stats")],
-                    [InlineKeyboardButton("⭐ Upgrade Premium", callback_data="premium_info")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
+            # Backpressure: no new work while draining for shutdown, cap pending jobs per user and overall
+            if self.stop_event.is_set():
+                await update.message.reply_text("🔧 The bot is restarting. Please try again in a moment.")
+                return
+            if user_jobs >= MAX_PENDING_JOBS_PER_USER:
                 await update.message.reply_text(
-                    f"✅ Successfully sent {success_count:,} **PERMANENT** reactions! 🔥\n"
-                    f"📊 Total reactions to this post: {db.get_post_reaction_stats(user_id, target_message_id, target_chat_id):,}\n"
-                    f"⏰ Limit resets in 5 minutes\n"
-                    f"🔥 These reactions will **NEVER** be removed!",
-                    reply_markup=reply_markup
+                    f"⏳ You already have {MAX_PENDING_JOBS_PER_USER} reaction jobs pending.\n"
+                    f"Please wait for them to finish before sending more."
                 )
-            else:
-                await update.message.reply_text("❌ Failed to send any reactions.")
+                return
+            if queue_full:
+                await update.message.reply_text("🚦 The reaction queue is full right now. Please try again in a minute.")
+                return
+            
+            if self.role == "ingest":
+                await self.enqueue_persisted_job(update, ReactJob(user_id, target_chat_id, target_message_id, num_reactions))
+                return
+            
+            # Reserve quota and enqueue the job, then reply right away with its id
+            job = ReactJob(user_id, target_chat_id, target_message_id, num_reactions)
+            self.reserve_job(job)
+            try:
+                job.status_message = await update.message.reply_text(
+                    f"⏳ Job #{job.job_id} queued: {num_reactions:,} **PERMANENT** reactions\n"
+                    f"📋 Position in queue: {self.react_queue.qsize() + 1}"
+                )
+                self.react_queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self.release_job(job)
+                await job.status_message.edit_text(f"🚦 Job #{job.job_id} rejected: the reaction queue is full. Please try again in a minute.")
+            except Exception:
+                self.release_job(job)
+                raise
                 
         except ValueError:
             await update.message.reply_text("❌ Please provide a valid number.")
@@ -1223,87 +4039,476 @@ Use the buttons below to get started!
             logger.error(f"Error in react_command: {e}")
             await update.message.reply_text("❌ An error occurred while processing your request.")
     
-    async def send_permanent_reactions(self, chat_id, message_id, num_reactions):
-        """Send multiple PERMANENT reactions to a specific message"""
+    def job_load(self, quota_key):
+        """(reactions reserved on the post, the user's pending jobs, queue full) for /react's checks"""
+        if self.role == "ingest":
+            reserved, user_jobs, total = db.get_react_job_load(*quota_key)
+            return reserved, user_jobs, total >= REACT_QUEUE_SIZE
+        return self.reserved_reactions.get(quota_key, 0), self.pending_jobs.get(quota_key[0], 0), self.react_queue.full()
+    
+    async def enqueue_persisted_job(self, update, job):
+        """Multi-process mode: hand the job to the delivery process for its chat through react_jobs.
+        
+        The row is the reservation: it counts against quota and queue limits until
+        the delivery process deletes it after logging the reactions.
+        """
+        status_message = await update.message.reply_text(
+            f"⏳ Queued: {job.num_reactions:,} **PERMANENT** reactions. This message will show progress."
+        )
+        job.status_chat_id, job.status_message_id = status_message.chat_id, status_message.message_id
+        if db.enqueue_react_job(job) is None:
+            await status_message.edit_text("❌ Could not queue your reactions. Please try again.")
+    
+    async def persisted_job_worker(self):
+        """Delivery process: run /react jobs the ingest process queued for this shard's chats"""
+        while not self.stop_event.is_set():
+            job = db.claim_react_job(self.shard)
+            if job is None:
+                await self.wait_for_stop(1)
+                continue
+            self.busy_job_workers += 1
+            try:
+                await self.run_react_job(job)
+            except Exception as e:
+                logger.error(f"Error running react job #{job.job_id}: {e}")
+                await self.edit_job_status(job, f"❌ Job #{job.job_id} failed: an error occurred while sending reactions.")
+            finally:
+                self.busy_job_workers -= 1
+            # Skipped on cancellation: the row stays running and the next start reports it
+            self.release_quota(job)
+    
+    async def report_interrupted_jobs(self):
+        """Tell users whose jobs this shard was running when it last stopped to send /react again"""
+        jobs = await asyncio.to_thread(db.take_interrupted_react_jobs, self.shard)
+        await asyncio.gather(*(
+            self.edit_job_status(job, f"⚠️ Job #{job.job_id} was interrupted because the bot restarted. Please send /react again.")
+            for job in jobs
+        ))
+    
+    def reserve_job(self, job):
+        """Count a queued job against its user's pending jobs and post quota.
+        
+        The quota is reserved in reactions, the unit get_post_reaction_stats
+        counts, so reserved + logged never counts a job twice or not at all.
+        """
+        self.pending_jobs[job.user_id] = self.pending_jobs.get(job.user_id, 0) + 1
+        job.quota_reserved = job.num_reactions
+        self.reserved_reactions[job.quota_key] = self.reserved_reactions.get(job.quota_key, 0) + job.quota_reserved
+    
+    def release_quota(self, job):
+        """Drop a job's quota reservation; call once its log row is written (or it logged nothing)"""
+        if not job.quota_reserved:
+            return
+        if job.persisted:
+            db.delete_react_job(job.job_id)
+            job.quota_reserved = 0
+            return
+        reserved = self.reserved_reactions.get(job.quota_key, 0) - job.quota_reserved
+        job.quota_reserved = 0
+        if reserved > 0:
+            self.reserved_reactions[job.quota_key] = reserved
+        else:
+            self.reserved_reactions.pop(job.quota_key, None)
+    
+    def release_job(self, job):
+        """Release the pending slot and any quota reservation still held by a job"""
+        remaining = self.pending_jobs.get(job.user_id, 0) - 1
+        if remaining > 0:
+            self.pending_jobs[job.user_id] = remaining
+        else:
+            self.pending_jobs.pop(job.user_id, None)
+        self.release_quota(job)
+    
+    async def react_job_worker(self):
+        """Background worker that runs queued /react jobs"""
+        while True:
+            job = await self.react_queue.get()
+            self.busy_job_workers += 1
+            try:
+                await self.run_react_job(job)
+            except Exception as e:
+                logger.error(f"Error running react job #{job.job_id}: {e}")
+                await self.edit_job_status(job, f"❌ Job #{job.job_id} failed: an error occurred while sending reactions.")
+            finally:
+                self.busy_job_workers -= 1
+                self.release_job(job)
+                self.react_queue.task_done()
+    
+    async def run_react_job(self, job):
+        """Send the reactions for a job, editing its status message with progress"""
+        total = min(job.num_reactions, 100)
+        await self.edit_job_status(job, f"🔄 Job #{job.job_id} running: 0/{total:,} reactions sent")
+        
+        last_edit = clock.monotonic()
+        
+        async def report_progress(done, total):
+            nonlocal last_edit
+            now = clock.monotonic()
+            if done < total and now - last_edit < REACT_PROGRESS_INTERVAL:
+                return
+            last_edit = now
+            await self.edit_job_status(job, f"🔄 Job #{job.job_id} running: {done:,}/{total:,} reactions sent")
+        
+        success_count, reactions_sent, _ = await self.send_permanent_reactions(
+            job.chat_id, job.message_id, job.num_reactions, progress_callback=report_progress
+        )
+        
+        if success_count > 0:
+            # Log as permanent reactions; from here the log row counts against the quota instead
+            db.log_permanent_reaction(job.user_id, job.message_id, job.chat_id, reactions_sent)
+            self.release_quota(job)
+            tier = premium_tiers.tier(job.user_id)
+            health_monitor.increment_reactions(success_count, job.chat_id, tier)
+            counters.incr("react_jobs", 1, job.chat_id, tier)
+            
+            keyboard = [
+                [InlineKeyboardButton("📊 Check Stats", callback_data="user_stats")],
+                [InlineKeyboardButton("⭐ Upgrade Premium", callback_data="premium_info")]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await self.edit_job_status(
+                job,
+                f"✅ Job #{job.job_id}: Successfully sent {success_count:,} **PERMANENT** reactions! 🔥\n"
+                f"📊 Total reactions to this post: {db.get_post_reaction_stats(job.user_id, job.message_id, job.chat_id):,}\n"
+                f"⏰ Limit resets in 5 minutes\n"
+                f"🔥 These reactions will **NEVER** be removed!",
+                reply_markup=reply_markup
+            )
+        else:
+            await self.edit_job_status(job, f"❌ Job #{job.job_id}: Failed to send any reactions.")
+    
+    async def edit_job_status(self, job, text, reply_markup=None):
+        """Edit a job's status message, ignoring edit failures"""
+        if not job.status_message and not job.status_message_id:
+            return
+        try:
+            if job.status_message:
+                await job.status_message.edit_text(text, reply_markup=reply_markup)
+            else:
+                await self.bot.edit_message_text(text, chat_id=job.status_chat_id, message_id=job.status_message_id,
+                                                 reply_markup=reply_markup)
+        except Exception as e:
+            logger.warning(f"Could not update status of react job #{job.job_id}: {e}", extra={"sample_key": "job_status_failed"})
+    
+    async def send_permanent_reactions(self, chat_id, message_id, num_reactions, progress_callback=None, trace=None):
+        """Send multiple PERMANENT reactions to a specific message.
+        
+        Returns (success_count, reactions_sent, last_error). A sampled post's
+        trace records when its first and last reaction call finished.
+        """
         success_count = 0
         reactions_sent = []
+        last_error = None
         max_batch_size = 10
+        total = min(num_reactions, 100)
+        
+        allowed = await self.reaction_catalog.get(self.bot, chat_id, **self.http.timeouts("default"))
+        if not allowed:
+            return 0, [], BadRequest("Reactions are disabled in this chat")
+        refreshed = False
         
-        for i in range(0, min(num_reactions, 100), max_batch_size):
-            batch_size = min(max_batch_size, num_reactions - i)
+        for i in range(0, total, max_batch_size):
+            batch_size = min(max_batch_size, num_reactions - i, len(allowed))
             
             try:
-                import random
-                reactions_to_send = random.sample(REACTION_EMOJIS, batch_size)
+                reactions_to_send = random.sample(allowed, batch_size)
                 
+                if trace:
+                    trace.mark("api_first")
                 await self.bot.set_message_reaction(
                     chat_id=chat_id,
                     message_id=message_id,
-                    reaction=reactions_to_send
+                    reaction=reactions_to_send,
+                    **self.http.timeouts("reactions")
                 )
+                if trace:
+                    trace.mark("api_last", overwrite=True)
                 success_count += batch_size
                 reactions_sent.extend(reactions_to_send)
                 
                 await asyncio.sleep(0.5)
                 
             except Exception as e:
-                logger.warning(f"Failed to send batch of permanent reactions: {e}")
-                continue
+                logger.warning(f"Failed to send batch of permanent reactions: {e}", extra={"sample_key": "reaction_batch_failed"})
+                last_error = e
+                if trace:
+                    trace.mark("api_last", overwrite=True)
+                # Further batches would hit the same rate limit or missing access
+                if isinstance(e, (RetryAfter, Forbidden)):
+                    break
+                # The chat's allowed reactions changed: reload them once and carry on
+                if is_invalid_reaction(e) and not refreshed:
+                    refreshed = True
+                    self.reaction_catalog.invalidate(chat_id)
+                    allowed = await self.reaction_catalog.get(self.bot, chat_id, **self.http.timeouts("default"))
+                    if not allowed:
+                        break
+            
+            if progress_callback:
+                await progress_callback(success_count, total)
         
-        return success_count, reactions_sent
+        return success_count, reactions_sent, last_error
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Exception while handling an update: {context.error}")
     
     def run(self):
-        """Start the bot with web server for health checks"""
-        # Start the web server for health checks
-        self.start_web_server()
-        # Start the bot
-        self.application.run_polling()
+        """Start the bot; the web server and background tasks start in post_init"""
+        if self.role == "delivery":
+            asyncio.run(self.run_delivery())
+            return
+        self.application.run_polling(timeout=LONG_POLL_TIMEOUT, allowed_updates=self.allowed_updates())
+    
+    async def run_delivery(self):
+        """Delivery process: no updates or web server, only reactions for this shard's channels"""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop_event.set)
+        
+        await asyncio.to_thread(db.connect)
+        await asyncio.to_thread(self.load_premium_tiers)
+        await self.application.initialize()
+        try:
+            await self.report_interrupted_jobs()
+            self.start_background_tasks()
+            logger.info(f"🚚 Delivery shard {DELIVERY_SHARD + 1}/{DELIVERY_PROCESSES} started")
+            await self.stop_event.wait()
+            await self.drain(SHUTDOWN_DRAIN_SECONDS)
+        finally:
+            await self.post_shutdown(self.application)
+            await self.application.shutdown()
     
-    def start_web_server(self):
+    def allowed_updates(self):
+        """Only the update types that have handlers, so Telegram doesn't send the rest"""
+        allowed = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.CHANNEL_POST, Update.MY_CHAT_MEMBER]
+        # chat_member updates are only delivered when requested explicitly
+        if MEMBERSHIP_MODE == "events":
+            allowed.append(Update.CHAT_MEMBER)
+        return allowed
+    
+    async def start_web_server(self):
         """Start a simple web server for health checks"""
+        from aiohttp import web
+        
+        # All probes answer from memory; the health check loop does the actual checking
         async def health_handler(request):
+            snapshot = health_monitor.snapshot
+            if not snapshot:
+                return web.json_response({"status": "starting"}, status=503)
+            return web.json_response(
+                dict(snapshot, http_pool=self.http.get_stats()),
+                status=200 if snapshot['status'] == "healthy" else 503
+            )
+        
+        async def livez_handler(request):
+            stalled_for = health_monitor.loop_stalled_for()
+            alive = stalled_for < LOOP_LAG_INTERVAL + LIVENESS_MAX_LAG_SECONDS
+            return web.json_response({
+                "status": "alive" if alive else "stalled",
+                "loop_lag_ms": round(health_monitor.loop_lag * 1000, 1),
+                "last_tick_seconds_ago": round(stalled_for, 2)
+            }, status=200 if alive else 503)
+        
+        async def readyz_handler(request):
+            snapshot = health_monitor.snapshot
+            if not snapshot:
+                return web.json_response({"status": "starting"}, status=503)
+            
+            database, bot_api = snapshot['database'], snapshot['bot_api']
+            checks = {
+                "database": database['ok'] and database['latency_ms'] <= READY_DB_MAX_MS,
+                "bot_api": bot_api['ok'] and bot_api['latency_ms'] <= READY_API_MAX_MS,
+                "fresh": health_monitor.snapshot_age() <= HEALTH_CHECK_INTERVAL * 3,
+                "accepting_work": not self.stop_event.is_set()
+            }
+            ready = all(checks.values())
+            return web.json_response({
+                "status": "ready" if ready else "not_ready",
+                "checks": checks,
+                "database_latency_ms": database['latency_ms'],
+                "bot_api_latency_ms": bot_api['latency_ms'],
+                "snapshot_age_seconds": round(health_monitor.snapshot_age(), 1)
+            }, status=200 if ready else 503)
+        
+        async def load_handler(request):
+            return web.json_response(self.get_load())
+        
+        def is_admin_request(request):
+            supplied = request.headers.get("Authorization", "").removeprefix("Bearer ") or request.query.get("token", "")
+            return hmac.compare_digest(supplied.encode(), ADMIN_API_TOKEN.encode())
+        
+        async def export_handler(request):
+            """GET /export/{table}?format=jsonl|csv&after=<id> streams a gzip file"""
+            if not is_admin_request(request):
+                return web.json_response({"error": "unauthorized"}, status=401)
+            
+            table = request.match_info['table']
+            fmt = request.query.get("format", "jsonl")
+            if table not in EXPORT_TABLES or fmt not in ("jsonl", "csv"):
+                return web.json_response({"error": "unknown table or format"}, status=400)
             try:
-                # Test database connection
-                db.get_channels()
-                stats = health_monitor.get_stats()
-                return web.json_response({
-                    "status": "healthy",
-                    "timestamp": datetime.now().isoformat(),
-                    "uptime": str(stats['uptime']),
-                    "total_reactions": stats['total_reactions_sent'],
-                    "total_posts": stats['total_posts_processed']
-                })
-            except Exception as e:
-                return web.json_response({
-                    "status": "unhealthy",
-                    "error": str(e)
-                }, status=500)
+                after_id = int(request.query.get("after", 0))
+            except ValueError:
+                return web.json_response({"error": "after must be an integer id"}, status=400)
+            if self.export_lock.locked():
+                return web.json_response({"error": "another export is running"}, status=429)
+            
+            response = web.StreamResponse(headers={
+                "Content-Type": "application/gzip",
+                "Content-Disposition": f'attachment; filename="{table}_after_{after_id}.{fmt}.gz"'
+            })
+            await response.prepare(request)
+            # Every row carries its id; resume with ?after=<last id received>
+            await self.stream_export(table, fmt, after_id, response.write)
+            await response.write_eof()
+            return response
         
         async def root_handler(request):
             return web.json_response({
                 "message": "Telegram Reaction Bot is running",
                 "status": "active",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": clock.now().isoformat()
             })
         
         app = web.Application()
         app.router.add_get('/', root_handler)
         app.router.add_get('/health', health_handler)
+        app.router.add_get('/livez', livez_handler)
+        app.router.add_get('/readyz', readyz_handler)
+        app.router.add_get('/load', load_handler)
+        if ADMIN_API_TOKEN:
+            app.router.add_get('/export/{table}', export_handler)
+            self.add_debug_routes(app, web, is_admin_request)
         
         port = int(os.environ.get("PORT", 8080))
         
-        # Run web server in background
-        async def run_web_app():
-            runner = web.AppRunner(app)
-            await runner.setup()
-            site = web.TCPSite(runner, '0.0.0.0', port)
-            await site.start()
-            logger.info(f"🌐 Web server running on port {port}")
+        self.web_runner = web.AppRunner(app)
+        await self.web_runner.setup()
+        site = web.TCPSite(self.web_runner, '0.0.0.0', port)
+        await site.start()
+        logger.info(f"🌐 Web server running on port {port}")
+
+    def add_debug_routes(self, app, web, is_admin_request):
+        """Profiling endpoints; their modules are imported and enabled only while in use"""
+        async def profile_handler(request):
+            """GET /debug/profile?seconds=N&sort=cumulative&limit=40"""
+            if not is_admin_request(request):
+                return web.json_response({"error": "unauthorized"}, status=401)
+            try:
+                seconds = min(float(request.query.get("seconds", 10)), PROFILE_MAX_SECONDS)
+                limit = int(request.query.get("limit", 40))
+            except ValueError:
+                return web.json_response({"error": "seconds and limit must be numbers"}, status=400)
+            sort = request.query.get("sort", "cumulative")
+            if self.profile_lock.locked():
+                return web.json_response({"error": "a profile is already running"}, status=429)
+            
+            import cProfile
+            import pstats
+            
+            async with self.profile_lock:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    profiler.disable()
+            
+            output = io.StringIO()
+            try:
+                pstats.Stats(profiler, stream=output).sort_stats(sort).print_stats(limit)
+            except KeyError:
+                return web.json_response({"error": f"unknown sort key {sort}"}, status=400)
+            return web.Response(text=output.getvalue())
+        
+        async def tracemalloc_handler(request):
+            """GET /debug/tracemalloc?action=start|snapshot|stop&limit=25&frames=1
+            
+            Each snapshot is diffed against the previous one, so repeated calls
+            show where memory grew in between.
+            """
+            if not is_admin_request(request):
+                return web.json_response({"error": "unauthorized"}, status=401)
+            
+            import tracemalloc
+            
+            action = request.query.get("action", "snapshot")
+            try:
+                limit = int(request.query.get("limit", 25))
+                frames = int(request.query.get("frames", 1))
+            except ValueError:
+                return web.json_response({"error": "limit and frames must be integers"}, status=400)
+            
+            if action == "start":
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(frames)
+                self.tracemalloc_baseline = tracemalloc.take_snapshot()
+                return web.Response(text=f"tracemalloc started ({frames} frames); baseline taken\n")
+            
+            if action == "stop":
+                tracemalloc.stop()
+                self.tracemalloc_baseline = None
+                return web.Response(text="tracemalloc stopped\n")
+            
+            if action != "snapshot":
+                return web.json_response({"error": "action must be start, snapshot or stop"}, status=400)
+            if not tracemalloc.is_tracing():
+                return web.json_response({"error": "tracemalloc is not running; use action=start"}, status=409)
+            
+            snapshot = tracemalloc.take_snapshot()
+            key_type = "traceback" if frames > 1 else "lineno"
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [f"traced: {current / 1024:.0f} KiB current, {peak / 1024:.0f} KiB peak"]
+            if self.tracemalloc_baseline:
+                lines.append(f"top {limit} differences since previous snapshot:")
+                stats = snapshot.compare_to(self.tracemalloc_baseline, key_type)
+            else:
+                lines.append(f"top {limit} allocations:")
+                stats = snapshot.statistics(key_type)
+            lines.extend(str(stat) for stat in stats[:limit])
+            self.tracemalloc_baseline = snapshot
+            return web.Response(text="\n".join(lines) + "\n")
+        
+        async def tasks_handler(request):
+            """GET /debug/tasks dumps every asyncio task with its current stack"""
+            if not is_admin_request(request):
+                return web.json_response({"error": "unauthorized"}, status=401)
+            
+            output = io.StringIO()
+            tasks = asyncio.all_tasks()
+            output.write(f"{len(tasks)} tasks\n\n")
+            for task in sorted(tasks, key=lambda t: t.get_name()):
+                output.write(f"=== {task.get_name()} ({'done' if task.done() else 'pending'}) ===\n")
+                task.print_stack(file=output)
+                output.write("\n")
+            return web.Response(text=output.getvalue())
+        
+        async def traces_handler(request):
+            """GET /debug/traces?format=json|otlp&limit=100 returns the most recent finished traces"""
+            if not is_admin_request(request):
+                return web.json_response({"error": "unauthorized"}, status=401)
+            try:
+                limit = int(request.query.get("limit", 100))
+            except ValueError:
+                return web.json_response({"error": "limit must be an integer"}, status=400)
+            fmt = request.query.get("format", "json")
+            traces = list(self.tracer.finished)[-limit:] if limit > 0 else []
+            if fmt == "otlp":
+                return web.json_response(PostTracer.to_otlp(traces))
+            if fmt != "json":
+                return web.json_response({"error": "format must be json or otlp"}, status=400)
+            return web.json_response({
+                **self.tracer.get_stats(),
+                "spans_seconds": self.tracer.summary(),
+                "in_flight": [trace.to_dict() for trace in self.tracer.active.values()][-limit:] if limit > 0 else [],
+                "traces": [trace.to_dict() for trace in traces]
+            })
         
-        asyncio.create_task(run_web_app())
+        app.router.add_get('/debug/profile', profile_handler)
+        app.router.add_get('/debug/tracemalloc', tracemalloc_handler)
+        app.router.add_get('/debug/tasks', tasks_handler)
+        app.router.add_get('/debug/traces', traces_handler)
 
 # Main execution
 if __name__ == "__main__":
@@ -1311,6 +4516,20 @@ if __name__ == "__main__":
     if not BOT_TOKEN or BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
         logger.error("❌ BOT_TOKEN environment variable is required!")
         exit(1)
+    if BOT_ROLE not in ("all", "ingest", "delivery", "supervisor"):
+        logger.error(f"❌ Unknown BOT_ROLE {BOT_ROLE!r}; use all, ingest, delivery or supervisor")
+        exit(1)
+    if DRAIN_ORDER not in ("oldest", "newest"):
+        logger.error(f"❌ Unknown DRAIN_ORDER {DRAIN_ORDER!r}; use oldest or newest")
+        exit(1)
+    if STALE_POST_ACTION not in ("skip", "defer"):
+        logger.error(f"❌ Unknown STALE_POST_ACTION {STALE_POST_ACTION!r}; use skip or defer")
+        exit(1)
+    
+    if BOT_ROLE == "supervisor":
+        print(f"🧩 Supervising 1 ingest and {DELIVERY_PROCESSES} delivery processes")
+        ProcessSupervisor().run()
+        exit(0)
     
     bot = ReactionBot(BOT_TOKEN)
     print("🤖 Reaction Bot is starting...")
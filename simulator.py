@@ -0,0 +1,354 @@
+"""Virtual-clock simulator for capacity planning of the reaction pipeline.
+
+Runs ReactionBot's channel post pipeline and the Database logic on a virtual
+clock against a simulated Bot API with modelled latency and flood limits, so
+days of synthetic traffic replay in seconds:
+
+    python simulator.py --channels 200 --posts-per-hour 2 --days 2
+
+Sleeps and timeouts advance the virtual clock instead of waiting, and every
+timestamp the bot writes comes from reaction_bot.clock, so quota windows,
+retry backoff and cleanup behave as they would over the simulated period.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import selectors
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", ":memory:")
+
+import reaction_bot
+from reaction_bot import Clock, ReactionBot, ADMIN_IDS, db
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+# Virtual time
+class VirtualClock(Clock):
+    """Clock that only moves when the simulated event loop has nothing to do"""
+
+    def __init__(self, start=None):
+        self.start = start or datetime.now().replace(microsecond=0)
+        self.elapsed = 0.0
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        return self.elapsed
+
+    def time(self):
+        return self.start.timestamp() + self.elapsed
+
+    def advance(self, seconds):
+        self.elapsed += max(0.0, seconds)
+
+class VirtualSelector(selectors.DefaultSelector):
+    """Selector that jumps the clock to the next timer instead of blocking"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            # Nothing scheduled and nothing ready: the simulation can never make progress
+            raise RuntimeError("Simulation stalled: no timers pending and no I/O ready")
+        self.clock.advance(timeout)
+        return []
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose time() is the virtual clock"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        super().__init__(VirtualSelector(clock))
+
+    def time(self):
+        return self.clock.monotonic()
+
+# Simulated Bot API
+class SimulatedBot:
+    """Stands in for telegram.Bot with modelled latency, flood limits and transient errors"""
+
+    def __init__(self, clock, latency_ms=80, jitter_ms=40, global_rate=30, chat_rate=20, error_rate=0.0):
+        self.clock = clock
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.global_rate = global_rate  # Calls per second across all chats
+        self.chat_rate = chat_rate      # Calls per minute to one chat
+        self.error_rate = error_rate
+        self.global_calls = deque()
+        self.chat_calls: dict = {}
+        self.calls = Counter()
+        self.calls_per_second = Counter()
+        self.calls_per_hour = Counter()
+        self.flood_limited = 0
+        self.errors = 0
+        self.broken_chats = set()       # Chats the bot was removed from
+
+    async def _call(self, method, chat_id=None):
+        now = self.clock.monotonic()
+        self.calls[method] += 1
+        self.calls_per_second[int(now)] += 1
+        self.calls_per_hour[int(now // 3600)] += 1
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        retry_after = self._check_limit(self.global_calls, self.global_rate, 1.0, now)
+        if chat_id is not None and not retry_after:
+            retry_after = self._check_limit(self.chat_calls.setdefault(chat_id, deque()), self.chat_rate, 60.0, now)
+        if retry_after:
+            self.flood_limited += 1
+            raise RetryAfter(math.ceil(retry_after))
+        if chat_id in self.broken_chats:
+            self.errors += 1
+            raise Forbidden("Forbidden: bot was kicked from the channel chat")
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            raise TimedOut("Simulated timeout")
+
+    @staticmethod
+    def _check_limit(calls, limit, window, now):
+        """Sliding-window limiter; returns seconds to wait if the call is over the limit"""
+        while calls and calls[0] <= now - window:
+            calls.popleft()
+        if len(calls) >= limit:
+            return calls[0] + window - now
+        calls.append(now)
+        return 0
+
+    async def set_message_reaction(self, chat_id, message_id, reaction=None, is_big=None, **kwargs):
+        await self._call("setMessageReaction", chat_id)
+        return True
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("sendMessage", chat_id)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        await self._call("editMessageText", chat_id)
+
+    async def get_chat(self, chat_id, **kwargs):
+        await self._call("getChat", chat_id)
+        # None: every standard emoji is allowed
+        return SimpleNamespace(available_reactions=None)
+
+    async def get_me(self, **kwargs):
+        await self._call("getMe")
+
+    async def get_chat_member(self, chat_id, user_id, **kwargs):
+        await self._call("getChatMember", chat_id)
+
+# Traffic and measurement
+class Simulation:
+    """Feeds synthetic channel posts through ReactionBot and records what happens"""
+
+    def __init__(self, args, clock, bot, api):
+        self.args = args
+        self.clock = clock
+        self.bot = bot
+        self.api = api
+        self.channel_ids = [-1001000000000 - i for i in range(args.channels)]
+        self.next_message_id = Counter()
+        self.created_at = {}
+        self.latencies = []
+        self.backlog = []
+        self.posts_generated = 0
+        api.broken_chats.update(self.channel_ids[:args.broken_channels])
+
+    def setup(self):
+        db.create_user(ADMIN_IDS[0])
+        for i, channel_id in enumerate(self.channel_ids):
+            db.add_channel(channel_id, f"simchannel{i}", f"Simulated channel {i}", ADMIN_IDS[0])
+
+        # Measure post latency where the pipeline finishes with a post
+        mark_post_processed = db.mark_post_processed
+
+        def tracked_mark_post_processed(post_id, reactions_sent, permanent_reaction_id=None):
+            mark_post_processed(post_id, reactions_sent, permanent_reaction_id)
+            created_at = self.created_at.pop(post_id, None)
+            if created_at is not None:
+                self.latencies.append(self.clock.monotonic() - created_at)
+
+        db.mark_post_processed = tracked_mark_post_processed
+
+    def post_rate(self, at):
+        """Posts per second across all channels, with an optional daily cycle"""
+        base = self.args.channels * self.args.posts_per_hour / 3600
+        return base * (1 + self.args.daily_swing * math.sin(2 * math.pi * at / 86400))
+
+    async def generate_traffic(self, duration):
+        """Poisson arrivals, thinned to follow the daily cycle"""
+        peak_rate = self.post_rate(86400 / 4)
+        if peak_rate <= 0:
+            return
+        while True:
+            await asyncio.sleep(random.expovariate(peak_rate))
+            now = self.clock.monotonic()
+            if now >= duration:
+                return
+            if random.random() * peak_rate > self.post_rate(now):
+                continue
+            channel_id = random.choice(self.channel_ids)
+            self.next_message_id[channel_id] += 1
+            trace = self.bot.tracer.start(channel_id, self.next_message_id[channel_id])
+            post_id = db.log_channel_post(channel_id, self.next_message_id[channel_id])
+            if trace and post_id:
+                self.bot.tracer.track(post_id, trace)
+            if post_id:
+                self.created_at[post_id] = now
+                self.bot.last_ingest_at = now
+                self.posts_generated += 1
+
+    async def sample_backlog(self):
+        while True:
+            self.backlog.append((self.clock.monotonic(), db.count_pending_posts()))
+            await asyncio.sleep(self.args.sample_seconds)
+
+    async def start_delivery(self):
+        """Start delivering after the simulated outage, if any, so the drain policy has a backlog to work on"""
+        await asyncio.sleep(self.args.outage_minutes * 60)
+        self.bot.supervisor.start("process_channel_posts", self.bot.process_channel_posts)
+
+    async def run(self, duration):
+        self.setup()
+        self.bot.supervisor.start("start_delivery", self.start_delivery)
+        self.bot.supervisor.start("periodic_cleanup", self.bot.periodic_cleanup)
+        self.bot.supervisor.start("sample_backlog", self.sample_backlog)
+        await self.generate_traffic(duration)
+        self.bot.stop_event.set()
+        await self.bot.supervisor.stop()
+        self.backlog.append((self.clock.monotonic(), db.count_pending_posts()))
+
+    def report(self, wall_seconds):
+        hours = max(self.clock.monotonic() / 3600, 1e-9)
+        latencies = sorted(self.latencies)
+        backlog_values = [value for _, value in self.backlog]
+        api_calls = sum(self.api.calls.values())
+        return {
+            "simulated_hours": round(hours, 2),
+            "wall_seconds": round(wall_seconds, 2),
+            "speedup": round(hours * 3600 / max(wall_seconds, 1e-9)),
+            "channels": self.args.channels,
+            "posts": {
+                "generated": self.posts_generated,
+                "processed": len(self.latencies),
+                "pending": backlog_values[-1] if backlog_values else 0,
+                **db.get_retry_stats()
+            },
+            "backlog": {
+                "max": max(backlog_values, default=0),
+                "final": backlog_values[-1] if backlog_values else 0,
+                "growth_per_hour": round(_slope(self.backlog) * 3600, 2)
+            },
+            "latency_seconds": {
+                "p50": _percentile(latencies, 0.50),
+                "p95": _percentile(latencies, 0.95),
+                "p99": _percentile(latencies, 0.99),
+                "max": round(latencies[-1], 2) if latencies else 0.0
+            },
+            "api_calls": {
+                "total": api_calls,
+                "by_method": dict(self.api.calls),
+                "per_hour_avg": round(api_calls / hours),
+                "per_hour_peak": max(self.api.calls_per_hour.values(), default=0),
+                "per_second_peak": max(self.api.calls_per_second.values(), default=0),
+                "per_post": round(api_calls / len(latencies), 2) if latencies else 0.0,
+                "flood_limited": self.api.flood_limited,
+                "errors": self.api.errors
+            },
+            "stages_seconds": self.bot.tracer.summary()
+        }
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+def _slope(samples):
+    """Least-squares slope of (t, value) samples"""
+    if len(samples) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_v = sum(v for _, v in samples) / len(samples)
+    variance = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not variance:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in samples) / variance
+
+def print_report(report):
+    posts, backlog, latency, api = report["posts"], report["backlog"], report["latency_seconds"], report["api_calls"]
+    print(f"⏱️ Simulated {report['simulated_hours']:.1f} h in {report['wall_seconds']:.1f} s ({report['speedup']:,}x)")
+    print(f"📢 Channels: {report['channels']:,}")
+    print(f"📝 Posts: {posts['generated']:,} generated, {posts['processed']:,} processed, "
+          f"{posts['pending']:,} pending, {posts['retrying']:,} retrying, {posts['dead_letters']:,} dead-lettered")
+    print(f"📈 Backlog: max {backlog['max']:,}, final {backlog['final']:,}, growth {backlog['growth_per_hour']:+.1f} posts/h")
+    print(f"🐢 Latency: p50 {latency['p50']:.1f}s, p95 {latency['p95']:.1f}s, p99 {latency['p99']:.1f}s, max {latency['max']:.1f}s")
+    print(f"📡 API calls: {api['total']:,} ({api['per_hour_avg']:,}/h avg, {api['per_hour_peak']:,}/h peak, "
+          f"{api['per_second_peak']}/s peak, {api['per_post']} per post)")
+    print(f"🚦 Flood limited: {api['flood_limited']:,}, errors: {api['errors']:,}")
+    if report["stages_seconds"]:
+        stages = ", ".join(f"{name} p50 {span['p50']:.1f}s/p95 {span['p95']:.1f}s" for name, span in report["stages_seconds"].items())
+        print(f"🔬 Traced stages: {stages}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic channel traffic through the reaction pipeline on a virtual clock")
+    parser.add_argument("--channels", type=int, default=100, help="Channels with auto-react enabled")
+    parser.add_argument("--posts-per-hour", type=float, default=2.0, help="Average posts per channel per hour")
+    parser.add_argument("--daily-swing", type=float, default=0.5, help="Daily traffic cycle amplitude, 0 for flat traffic")
+    parser.add_argument("--days", type=float, default=1.0, help="Simulated days of traffic")
+    parser.add_argument("--latency-ms", type=float, default=80, help="Mean Bot API latency")
+    parser.add_argument("--jitter-ms", type=float, default=40, help="Bot API latency standard deviation")
+    parser.add_argument("--global-rate", type=int, default=30, help="Bot API calls per second before flood limits")
+    parser.add_argument("--chat-rate", type=int, default=20, help="Bot API calls per minute per chat before flood limits")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with a timeout")
+    parser.add_argument("--outage-minutes", type=float, default=0, help="Minutes before delivery starts, leaving a backlog to drain")
+    parser.add_argument("--broken-channels", type=int, default=0, help="Channels the bot was removed from without being told")
+    parser.add_argument("--trace-sample-rate", type=float, default=0.05, help="Fraction of posts traced for the stage breakdown")
+    parser.add_argument("--sample-seconds", type=float, default=60, help="Backlog sampling interval")
+    parser.add_argument("--database", default=":memory:", help="SQLite database to simulate against")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible run")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--log-level", default="ERROR", help="Log level for the bot while simulating")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    clock = VirtualClock()
+    reaction_bot.clock = clock
+    db.db_path = args.database
+    db.connect()
+
+    loop = VirtualEventLoop(clock)
+    asyncio.set_event_loop(loop)
+    api = SimulatedBot(clock, args.latency_ms, args.jitter_ms, args.global_rate, args.chat_rate, args.error_rate)
+    bot = ReactionBot(reaction_bot.BOT_TOKEN if ":" in reaction_bot.BOT_TOKEN else "0:simulated")
+    bot.bot = api
+    bot.tracer.sample_rate = args.trace_sample_rate
+    simulation = Simulation(args, clock, bot, api)
+
+    started = time.perf_counter()
+    try:
+        loop.run_until_complete(simulation.run(args.days * 86400))
+        report = simulation.report(time.perf_counter() - started)
+    finally:
+        loop.close()
+        db.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()